@@ -9,23 +9,28 @@
 
 
 import random
-import math
 import sys
 from cocos.director import director
 from cocos.layer import Layer, ColorLayer
 from cocos.scene import Scene
 from cocos.scenes.transitions import RotoZoomTransition
-from cocos.actions import MoveBy, MoveTo, RotateBy, Repeat, Reverse
+from cocos.actions import MoveBy, MoveTo, Reverse
 from cocos.sprite import Sprite
+from cocos.batch import BatchNode
 # from cocos.audio.effect import Effect
 from cocos.cocosnode import CocosNode
-from cocos import collision_model
-from cocos import euclid
 
 import pyglet
 from pyglet.window import key
 # from pyglet.media import ManagedSoundPlayer
-from cshape import OrientableRectShape
+from shapebatch import ShapeBatch
+from pool import Pool
+from activeset import ActiveSet
+from collision import GridCollisionManager, SweepAndPruneCollisionManager
+from simulation import (PlayerState, choose_kind, bug_speed, spawn_location,
+                        spawn_half_width, sway_rotation, step_move, find_blocked_bugs,
+                        SPAWN_MARGIN)
+from spawn import SpawnAllocator
 
 class HomeLayer(Layer):
     ''' Game menu. '''
@@ -59,18 +64,24 @@ class BugLayer(Layer):
 
     is_event_handler = True     # Enable pyglet's events.
 
-    def __init__(self, player):
+    def __init__(self, player, sweep_and_prune=False):
+        ''' sweep_and_prune: whether to find the colliding bugs by sweep
+            and prune rather than with a grid '''
         super(BugLayer, self).__init__()
         self.player = player
 
-        cell_width = 100    # ~ bug image width * 1,25
-        cell_height = 190   # ~bug image height * 1.25
-        screen_width, screen_height = director.get_window_size()
-        self.collision_manager = collision_model.CollisionManagerGrid(
-                                                        0.0, screen_width,
-                                                        0.0, screen_height,
-                                                        cell_width,
-                                                        cell_height)
+        if sweep_and_prune:
+            self.collision_manager = SweepAndPruneCollisionManager()
+        else:
+            cell_width = 100    # ~ bug image width * 1,25
+            cell_height = 190   # ~bug image height * 1.25
+            self.collision_manager = GridCollisionManager(cell_width,
+                                                          cell_height)
+
+        # The bug images share a texture, see AnimationCache: all the bugs
+        # are drawn at once.
+        self.bug_batch = BatchNode()
+        self.add(self.bug_batch)
 
     def on_mouse_press(self, point_x, point_y, buttons, modifiers):
         ''' invoked when the mouse button is pressed
@@ -82,7 +93,8 @@ class BugLayer(Layer):
                                                               mouse_y):
             self.shake()
             self.player.add_points(bug.value)
-            kill_bug(bug)
+            GAME_MODEL.kill_bug(bug)
+        GAME_MODEL.flush_killed_bugs()
 
     def on_key_press(self, key_code, modifiers):
         """ invoked when a keyboard key is pressed 
@@ -99,11 +111,13 @@ class BugLayer(Layer):
         shake = shake_part + Reverse(shake_part)*2 + shake_part
         self.do(shake)
 
-    def remove_all(self):
-        ''' removes all children from this layer '''
-        bugs = self.get_children()
-        for bug in bugs:
-            self.remove(bug)
+    def add_bug(self, bug):
+        ''' shows a bug '''
+        self.bug_batch.add(bug)
+
+    def remove_bug(self, bug):
+        ''' hides a bug '''
+        self.bug_batch.remove(bug)
 
 
 class HudLayer(Layer):
@@ -199,163 +213,161 @@ class GameOverLayer(Layer):
             return False
 
 
-class Player(object):
+class Player(PlayerState):
     """ the human player """
 
-    def __init__(self):
-        self.MAX_LIFE = 100
-        self.LIFE_POINT_PER_BUG = 50
-        self.reset()
-
-    def reset(self):
-        ''' turns player to its initial state: full life, no points'''
-        self.score = 0
-        self.life = self.MAX_LIFE
-
     def add_points(self, points):
         """ increase player score
             points: the  number of points to add to the score
         """
-        self.score += points
+        super(Player, self).add_points(points)
         print 'actuated > score= ', self.score
 
     def remove_life_points(self):
         """ decrease player life points, if it is positive 
+            the game is over when there are no more
         """
-        if self.life >= self.LIFE_POINT_PER_BUG:
-            self.life -= self.LIFE_POINT_PER_BUG
-        else:
-            self.life = 0
-        if self.life == 0:
+        if not super(Player, self).remove_life_points():
             print 'before stop > score= ', self.score
             GAME_MODEL.stop()
-            BUG_LAYER.remove_all()
+            GAME_MODEL.kill_all()
             director.replace(RotoZoomTransition(GAME_OVER_SCENE, 1.25))
 
 
+class AnimationCache(object):
+    ''' Sprite sheets, image grids and animations shared by all the bugs,
+        loaded when first needed.
+        pyglet.resource packs the sprite sheets in a single texture atlas,
+        so BugLayer can draw all the bugs in one batch. '''
+
+    COLUMNS = 6     # animation frames per sprite sheet
+
+    def __init__(self):
+        self._grids = {}        # image -> ImageGrid of the sprite sheet
+        self._animations = {}   # (image, period) -> Animation
+
+    def grid(self, image):
+        ''' returns the ImageGrid of the frames of a sprite sheet '''
+        grid = self._grids.get(image)
+        if grid is None:
+            bug_sprite_sheet = pyglet.resource.image(image)
+            grid = pyglet.image.ImageGrid(bug_sprite_sheet, 1, self.COLUMNS)
+            self._grids[image] = grid
+        return grid
+
+    def animation(self, image, period):
+        ''' returns the animation of a sprite sheet
+            period: duration of a frame, in seconds '''
+        key = (image, period)
+        animation = self._animations.get(key)
+        if animation is None:
+            animation = self.grid(image).get_animation(period)
+            self._animations[key] = animation
+        return animation
+
+ANIMATIONS = AnimationCache()
+
+
 class Bug(Sprite):
 
     ''' Characters to be destroyed. '''
-    def __init__(self):
-        self.duration = random.randint(2, 8)
-        if(self.duration < 5):
-            self.value = 1000   
-            image = 'bug1-small.png'
-        else:
-            self.value = 500
-            image = 'bug2-small.png'
+    def __init__(self, shape_batch):
+        ''' shape_batch: the ShapeBatch holding the collision shape '''
+        self.duration, self.value, image = choose_kind(random)
 
-        bug_sprite_sheet = pyglet.resource.image(image)
-        bug_grid = pyglet.image.ImageGrid(bug_sprite_sheet, 1, 6)
         animation_period = max(self.duration / 100, 0.05)  # seconds
 
-        animation = bug_grid.get_animation(animation_period)
-        super(Bug, self).__init__(animation)
+        super(Bug, self).__init__(ANIMATIONS.animation(image, animation_period))
 
         screen_height = director.get_window_size()[1]
 
         rect = self.get_rect()
 
-        self.speed = (screen_height + rect.height) / self.duration
-        self.cshape = OrientableRectShape(
-            euclid.Vector2(rect.center[0], rect.center[1]),
-                           rect.width / 2, rect.height / 2, 0)
-        self.is_colliding = False
-
-    def start(self):
-        ''' places the bug to its start position
-            duration: the time in second for the
-            bug to go to the bottom of the screen '''
-        self.spawn()
-
-        self.is_colliding = self.respawn_on_collision()
-        collision_counter = 1 if self.is_colliding else 0
-        while self.is_colliding:
-            self.is_colliding = self.respawn_on_collision()
-            if self.is_colliding:
-                collision_counter += 1
-            if collision_counter > 3:
-                break
+        self.speed = bug_speed(screen_height, rect.height, self.duration)
+        self.cshape = shape_batch.add(rect.center[0], rect.center[1],
+                                      rect.width / 2, rect.height / 2, 0)
+        # simulated by cb_update, the position is interpolated between them
+        self.location = self.previous_location = self.position
+        # likewise for the rotation, see sway
+        self.sway_angle = self.previous_sway_angle = 0
+        self.start_time = 0.0
+
+    def start(self, spawn_x):
+        ''' places the bug to its start position, on top of the screen
+            spawn_x: its horizontal position, see SpawnAllocator '''
+        screen_height = director.get_window_size()[1]
+        self.place(spawn_location(spawn_x, self.get_rect().height, screen_height))
 
-        self.rotation = -self.duration
-        rotate = RotateBy(self.duration * 2, 1)
-        self.do(Repeat(rotate + Reverse(rotate)))
+        self.start_time = GAME_MODEL.time
+        self.rotation = self.sway_angle = self.previous_sway_angle = -self.duration
 
-        rect = self.get_rect()
-        self.cshape.center = euclid.Vector2(rect.center[0], rect.center[1])
-
-    def spawn(self):
-        ''' pops at a random place on top of the screen '''
-        rect = self.get_rect()
-        half_width = rect.width / 2
-        screen_width, screen_height = director.get_window_size()
-        spawn_x = random.randint(half_width, screen_width - half_width)
-        self.position = (spawn_x, screen_height + rect.height / 2)
-        self.cshape.center.x, self.cshape.center.y = self.position
-        self.cshape.update_position()
         self.cshape.rotate(self.rotation)
+        self.cshape.refresh()
 
-    def respawn_on_collision(self):
-        ''' if the bug is colliding with another one,
-            redraw it at another random place on top of screen
-            returns True when it was colliding
-        '''
-        is_colliding = False
-        for other in GAME_MODEL.active_bug_list:
-            if BUG_LAYER.collision_manager.they_collide(self, other):
-                self.spawn()
-                is_colliding = True
-                break
-        return is_colliding
+    def place(self, location):
+        ''' moves the bug at once to location, without interpolation '''
+        self.location = self.previous_location = location
+        self.position = location
+        self.cshape.move_to(*location)
 
     def move_by(self, delta_x, delta_y):
-        ''' moves the bug
+        ''' moves the simulated location of the bug, see GameModel.tick
             delta_x distance in pixels along horizontal axis
             delta_y distance in pixels along vertical axis '''
-        self.position = (self.position[0] + delta_x, self.position[1] + delta_y)
-        self.cshape.center.x, self.cshape.center.y = self.position
-        self.cshape.update_position()
+        self.location = (self.location[0] + delta_x, self.location[1] + delta_y)
+        # the corners are computed for all the bugs at once, see cb_update
+        self.cshape.move_to(*self.location)
         self.cshape.rotate(self.rotation)
 
+    def sway(self, time):
+        ''' turns the bug for a simulation step, see sway_rotation
+            time: the simulated time, GameModel.time '''
+        self.previous_sway_angle = self.sway_angle
+        self.sway_angle = sway_rotation(self.duration, time - self.start_time)
+        # the simulation step moves the bug along it, see step_move
+        self.rotation = self.sway_angle
+
+    def interpolate(self, alpha):
+        ''' draws the bug between its previous and its current location
+            and rotation
+            alpha: 0 for the previous location, 1 for the current one '''
+        previous_x, previous_y = self.previous_location
+        x, y = self.location
+        self.position = (previous_x + (x - previous_x) * alpha,
+                         previous_y + (y - previous_y) * alpha)
+        previous_angle = self.previous_sway_angle
+        self.rotation = previous_angle + (self.sway_angle - previous_angle) * alpha
+
+    def top(self):
+        ''' returns the top of the bug image at its simulated location '''
+        return self.location[1] + self.height / 2.0
+
 
 def cb_update(delta_t, *args, **kwargs):
     ''' Updates the bugs position
         kills them when they are going out of the screen, 
         and decrease player life points
-        invoked at each frame
-        delta_t: time elapsed since previous call '''
-    BUG_LAYER.collision_manager.clear()
-    for bug in GAME_MODEL.active_bug_list:
-        BUG_LAYER.collision_manager.add(bug)
+        invoked at each simulation step, see GameModel.tick
+        delta_t: the duration of a step, GameModel.STEP
+        the killed bugs are removed at the end, see GameModel.kill_bug '''
+    GAME_MODEL.shape_batch.update()
+    BUG_LAYER.collision_manager.update()
 
     screen_width = director.get_window_size()[0]
+    blocked_bugs = find_blocked_bugs(BUG_LAYER.collision_manager)
 
-    for bug in GAME_MODEL.active_bug_list:
-        delta_y = bug.speed * delta_t / bug.duration
-        if delta_y < 0.2:
-            delta_y = 0.2
-        can_move = True
-        for other in BUG_LAYER.collision_manager.iter_colliding(bug):
-            if bug.get_rect().top >= other.get_rect().top:
-                can_move = False    # blocked by a colliding bug
-
-        if can_move:
-            if bug.rotation > 180:
-                rotation = bug.rotation - 360
-            else:
-                rotation = bug.rotation
-
-            delta_x = - delta_y * math.sin(rotation)
-            if bug.x - bug.width < 0 and delta_x < 0:
-                delta_x = 0
-            elif bug.x + bug.width > screen_width and delta_x > 0:
-                delta_x = 0
-
+    for bug in GAME_MODEL.active_bugs:
+        if not GAME_MODEL.is_running:
+            break   # game over
+        if bug not in blocked_bugs:
+            delta_x, delta_y = step_move(bug, delta_t, screen_width)
             bug.move_by(delta_x, -delta_y)
             
-            if bug.position[1] < 0:
+            if bug.location[1] < 0:
                 PLAYER.remove_life_points()
-                kill_bug(bug)
+                GAME_MODEL.kill_bug(bug)
+
+    GAME_MODEL.flush_killed_bugs()
 
 
 class SoundManager(object):
@@ -367,71 +379,121 @@ class SoundManager(object):
         # self.buzz_sound.eos_action = ManagedSoundPlayer.EOS_LOOP 
 
 class GameModel(CocosNode):
+    STEP = 1 / 60.0             # duration of a simulation step, in seconds
+    MAX_STEPS_PER_FRAME = 5     # the game slows down beyond
+
     def __init__(self):
         super(GameModel, self).__init__()
-        self.active_bug_list = []
-        self.bug_pool = []
-        for i in range(50):
-            self.bug_pool.append(Bug())
+        self.is_running = False
+        self.accumulator = 0.0      # simulated time to catch up with
+        self.time = 0.0             # simulated time since the game start
+        self.active_bugs = ActiveSet()
+        screen_width, screen_height = director.get_window_size()
+        self.spawn_allocator = SpawnAllocator(screen_width,
+                                              screen_height - SPAWN_MARGIN)
+        self.shape_batch = ShapeBatch()
+        self.bug_pool = Pool(lambda: Bug(self.shape_batch), prewarm=50,
+                             low_water=5, grow_step=1, shrink_after=30.0,
+                             discard=self.discard_bug)
 
     def activate_bug(self):
         ''' Get a bug instance from the pool or
             creates one when the pool is empty.
-            Then add it to the game '''
-        if len(self.bug_pool):
-            bug = self.bug_pool.pop(random.randint(0, len(self.bug_pool) - 1))
-        else:
-            bug = Bug()
-        bug.start()
-        self.active_bug_list.append(bug)
+            Then add it to the game, where there is room on top of the
+            screen.
+            returns the bug, or None when there is no room for it '''
+        bug = self.bug_pool.acquire()
+        half_width = spawn_half_width(bug)
+        spawn_x = self.spawn_allocator.sample(random, half_width)
+        if spawn_x is None:
+            self.bug_pool.release(bug)
+            return None
+        bug.start(spawn_x)
+        self.active_bugs.add(bug)
+        self.spawn_allocator.add(bug, half_width)
+        BUG_LAYER.add_bug(bug)
+        BUG_LAYER.collision_manager.add(bug)
         return bug
 
-    def deactivate_bug(self, bug):
-        ''' puts a bug out of the game '''
-        bug.stop()
-        self.active_bug_list.remove(bug)
-        self.bug_pool.append(bug)
-        
+    def kill_bug(self, bug):
+        ''' puts a bug out of the game at the next flush_killed_bugs(), so
+            it can be invoked while iterating over the active bugs '''
+        self.active_bugs.kill(bug)
+
+    def kill_all(self):
+        ''' kills all the active bugs, see kill_bug '''
+        for bug in self.active_bugs:
+            self.active_bugs.kill(bug)
+
+    def flush_killed_bugs(self):
+        ''' puts the killed bugs out of the game '''
+        for bug in self.active_bugs.flush():
+            self._deactivate_bug(bug)
+
     def deactivate_all(self):
-        for bug in self.active_bug_list:
-            self.deactivate_bug(bug)
+        ''' puts all the bugs out of the game at once '''
+        for bug in self.active_bugs.clear():
+            self._deactivate_bug(bug)
+
+    def _deactivate_bug(self, bug):
+        bug.stop()
+        BUG_LAYER.remove_bug(bug)
+        BUG_LAYER.collision_manager.remove_tricky(bug)
+        self.spawn_allocator.remove(bug)
+        self.bug_pool.release(bug)
+
+    def discard_bug(self, bug):
+        ''' destroys a bug the pool does not need anymore '''
+        self.shape_batch.remove(bug.cshape)
 
     def start(self):
         ''' starts the game'''
         self.deactivate_all()
+        self.is_running = True
+        self.accumulator = 0.0
+        self.time = 0.0
         self.schedule_interval(cb_create_bug, 1)  # Creates a bug every second
-        self.schedule(cb_update)
+        self.schedule(self.tick)
         self.resume_scheduler()
         PLAYER.reset()
 
     def stop(self):
         ''' stops the game '''
+        self.is_running = False
         self.pause_scheduler()
         self.unschedule(cb_create_bug)
-        self.unschedule(cb_update)
+        self.unschedule(self.tick)
+
+    def tick(self, delta_t, *args, **kwargs):
+        ''' runs the simulation steps due since the previous frame,
+            then draws the bugs between their last two locations
+            invoked at each frame
+            delta_t: time elapsed since previous call '''
+        self.bug_pool.maintain(delta_t)
+        self.accumulator += delta_t
+        steps = 0
+        while self.accumulator >= self.STEP and self.is_running:
+            if steps == self.MAX_STEPS_PER_FRAME:
+                self.accumulator %= self.STEP    # too late, skips the rest
+                break
+            self.time += self.STEP
+            for bug in self.active_bugs:
+                bug.previous_location = bug.location
+                bug.sway(self.time)
+            cb_update(self.STEP)
+            self.accumulator -= self.STEP
+            steps += 1
+
+        alpha = self.accumulator / self.STEP
+        for bug in self.active_bugs:
+            bug.interpolate(alpha)
 
 
 def cb_create_bug(delta_t, *args, **kwargs):
     ''' Get a bug instance from the pool or
         creates one when the pool is empty. 
         delta_t is the time elapsed since previous call'''
-    bug  = GAME_MODEL.activate_bug()
-    BUG_LAYER.add(bug)
-    BUG_LAYER.collision_manager.add(bug)
-    if bug.is_colliding:
-        kill_bug(bug) # the bug did not find any free place to spawn
-
-def kill_bug(bug):
-    """ removes a bug from the game scene"""
-    GAME_MODEL.deactivate_bug(bug)
-    try:
-        BUG_LAYER.collision_manager.remove_tricky(bug)
-    except KeyError:
-        pass
-    try:
-        BUG_LAYER.remove(bug)
-    except Exception:
-        pass
+    GAME_MODEL.activate_bug()   # None when there is no room on top of the screen
 
 class NotifiyingTransition(RotoZoomTransition):
     '''A RotoZoomTransition with an end notification'''
@@ -449,10 +511,13 @@ class NotifiyingTransition(RotoZoomTransition):
 if __name__ == "__main__":
     
     FULLSCREEN = False
+    SWEEP_AND_PRUNE = False
 
     for arg in sys.argv:
         if arg == 'fullscreen': 
             FULLSCREEN = True
+        elif arg == 'sweep':
+            SWEEP_AND_PRUNE = True
 
     pyglet.resource.path = ['images', 'sounds', 'fonts']
     pyglet.resource.reindex()
@@ -466,7 +531,7 @@ if __name__ == "__main__":
     COLOR_LAYER = ColorLayer(128, 16, 16, 255)
     HOME_SCENE = Scene(COLOR_LAYER, HOME_LAYER)
     PLAYER = Player()
-    BUG_LAYER = BugLayer(PLAYER)
+    BUG_LAYER = BugLayer(PLAYER, SWEEP_AND_PRUNE)
     HUD_LAYER = HudLayer(PLAYER)
     GAME_SCENE = Scene(BUG_LAYER, HUD_LAYER)
     GAME_OVER_LAYER = GameOverLayer()
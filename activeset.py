@@ -0,0 +1,83 @@
+""" The set of the objects in play, like the active bugs """
+
+__all__ = ['ActiveSet']
+
+
+class ActiveSet(object):
+    """
+    Objects kept in a dense list, for fast iteration, with their index in
+    it: add(), remove() and membership are O(1). The removed object is
+    replaced by the last one, so the iteration order changes.
+
+    Objects must not be removed while iterating: kill() queues them
+    instead, and flush() removes the queued objects, once the iteration is
+    over.
+    """
+
+    def __init__(self):
+        self._objs = []
+        self._indexes = {}      # object -> index in _objs
+        self._killed = []
+        self._killed_set = set()
+
+    def __len__(self):
+        return len(self._objs)
+
+    def __iter__(self):
+        return iter(self._objs)
+
+    def __contains__(self, obj):
+        return obj in self._indexes
+
+    def add(self, obj):
+        """ adds an object, which must not be in the set """
+        if obj in self._indexes:
+            raise ValueError('%r is already active' % (obj,))
+        self._indexes[obj] = len(self._objs)
+        self._objs.append(obj)
+
+    def remove(self, obj):
+        """ removes an object at once, raises KeyError if it is not in the set """
+        index = self._indexes.pop(obj)
+        last = self._objs.pop()
+        if last is not obj:
+            self._objs[index] = last
+            self._indexes[last] = index
+        if obj in self._killed_set:
+            self._killed_set.discard(obj)
+            self._killed.remove(obj)
+
+    def kill(self, obj):
+        """ queues an object of the set for removal by flush()
+            returns False if it was queued already """
+        if obj in self._killed_set:
+            return False
+        if obj not in self._indexes:
+            raise KeyError(obj)
+        self._killed.append(obj)
+        self._killed_set.add(obj)
+        return True
+
+    def is_killed(self, obj):
+        """ whether an object is queued for removal """
+        return obj in self._killed_set
+
+    def flush(self):
+        """ removes the queued objects
+            :rtype: list of the removed objects, in the kill() order """
+        killed = self._killed
+        self._killed = []
+        self._killed_set = set()
+        for obj in killed:
+            self.remove(obj)
+        return killed
+
+    def clear(self):
+        """ removes all the objects, queued or not
+            :rtype: list of the removed objects """
+        objs = self._objs
+        self._objs = []
+        self._indexes = {}
+        self._killed = []
+        self._killed_set = set()
+        return objs
@@ -0,0 +1,52 @@
+import unittest
+from activeset import ActiveSet
+
+
+class ActiveSetTest (unittest.TestCase):
+
+    def test_add_remove(self):
+        active = ActiveSet()
+        for obj in 'abcd':
+            active.add(obj)
+        self.assertRaises(ValueError, active.add, 'a')
+
+        active.remove('b')
+        self.assertEqual(list(active), ['a', 'd', 'c'])
+        self.assertFalse('b' in active)
+        self.assertRaises(KeyError, active.remove, 'b')
+
+        active.remove('c')
+        active.remove('a')
+        self.assertEqual(list(active), ['d'])
+        self.assertEqual(len(active), 1)
+
+    def test_kill_while_iterating(self):
+        active = ActiveSet()
+        for obj in range(6):
+            active.add(obj)
+
+        for obj in active:
+            if obj % 2 == 0:
+                active.kill(obj)
+        self.assertFalse(active.kill(2))
+        self.assertTrue(active.is_killed(4))
+        self.assertEqual(len(active), 6)
+
+        self.assertEqual(active.flush(), [0, 2, 4])
+        self.assertEqual(sorted(active), [1, 3, 5])
+        self.assertFalse(active.is_killed(4))
+        self.assertEqual(active.flush(), [])
+        self.assertRaises(KeyError, active.kill, 0)
+
+    def test_clear(self):
+        active = ActiveSet()
+        for obj in range(3):
+            active.add(obj)
+        active.kill(1)
+        self.assertEqual(sorted(active.clear()), [0, 1, 2])
+        self.assertEqual(len(active), 0)
+        self.assertEqual(active.flush(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -118,6 +118,21 @@ class CshapeTest (unittest.TestCase):
         self.assertFalse(rect1.overlaps(rect6))
         self.assertFalse(rect6.overlaps(rect1))
 
+    def test_overlaps_cross_shaped(self):
+        # no corner nor center of one rectangle lies inside the other one
+        horizontal = OrientableRectShape(euclid.Vector2(0, 0), 5, 1, 0)
+        vertical = OrientableRectShape(euclid.Vector2(1.5, 2), 1, 4, 0)
+        self.assertTrue(horizontal.overlaps(vertical))
+        self.assertTrue(vertical.overlaps(horizontal))
+
+        rotated = OrientableRectShape(euclid.Vector2(1.5, 2), 1, 4, 30)
+        self.assertTrue(horizontal.overlaps(rotated))
+
+    def test_overlaps_touching_edge(self):
+        rect1, center1 = self._create_rectangle()
+        rect2, center2 = self._create_rectangle(3, 2)
+        self.assertFalse(rect1.overlaps(rect2))
+
     def test_get_square_distance(self):
         rect1, center1 = self._create_rectangle()
         p1 = Point(1, 2)
@@ -134,7 +149,22 @@ class CshapeTest (unittest.TestCase):
 
         # overlapping shapes
         rect4, center4 = self._create_rectangle(1, 1)
-        self.assertEqual(rect1.distance(rect4), 1)
+        self.assertEqual(rect1.distance(rect4), 0)
+
+    def test_distance_corner_to_edge(self):
+        rect1, center1 = self._create_rectangle()
+        # a corner of the rotated square points at the middle of the right edge
+        rect2, center2 = self._create_rectangle(3 + math.sqrt(2), 2, 45)
+        self.assertTrue(are_nearly_equal(rect1.distance(rect2), 1))
+        self.assertTrue(are_nearly_equal(rect2.distance(rect1), 1))
+
+    def test_near_than(self):
+        rect1, center1 = self._create_rectangle()
+        rect2, center2 = self._create_rectangle(4, 5)
+        # closest corners (2, 3) and (3, 4)
+        self.assertTrue(rect1.near_than(rect2, 1.5))
+        self.assertFalse(rect1.near_than(rect2, 1.4))
+        self.assertFalse(rect1.near_than(rect2, 0.5))
 
     def test_minmax(self):
         rect1, center1 = self._create_rectangle()
@@ -148,6 +178,28 @@ class CshapeTest (unittest.TestCase):
         rect2, center2 = self._create_rectangle(0, 0, 45)
         self.assertTrue(rect2.fits_in_box((-1.5, 1.5, -1.5, 1.5)))
 
+    def test_transforms_in_place(self):
+        rectangle, center = self._create_rectangle()
+        corners = [rectangle.A, rectangle.B, rectangle.C, rectangle.D]
+
+        rectangle.rotate(90)
+        rectangle.move_by(1, 1)
+        center.x, center.y = 4, 4
+        rectangle.update_position()
+        rectangle.rotate(90)
+
+        self.assertEqual([rectangle.A, rectangle.B, rectangle.C, rectangle.D], corners)
+        self.assertTrue(are_nearly_equal(rectangle.A.x, 3))
+        self.assertTrue(are_nearly_equal(rectangle.A.y, 3))
+        self.assertTrue(are_nearly_equal(rectangle.C.x, 5))
+        self.assertTrue(are_nearly_equal(rectangle.C.y, 5))
+
+    def test_rotate_to_same_angle(self):
+        rectangle, center = self._create_rectangle(0, 0, 30)
+        rectangle._sin = rectangle._cos = None  # would fail if trig were used
+        rectangle.rotate(30)
+        self.assertEqual(rectangle.angle, 30)
+
     def _create_rectangle(self, center_x=1, center_y=2, angle = 0):
         """
         returns a test rectangle (a 2x2 square indeed, centered on point (1,2))
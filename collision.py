@@ -0,0 +1,253 @@
+"""
+Collision managers for the bugs.
+
+They implement the part of the cocos CollisionManager interface used by the
+game (add, remove_tricky, clear, knows, they_collide, iter_colliding,
+objs_touching_point), for objects having a cshape like OrientableRectShape
+or BatchRectShape. Unlike the cocos managers, they are not rebuilt each
+frame: update() must be invoked once the shapes have moved, and only
+moves what changed.
+"""
+
+import math
+
+__all__ = ['GridCollisionManager', 'SweepAndPruneCollisionManager']
+
+
+class GridCollisionManager(object):
+    """
+    Spatial hash: the plane is divided in cells, and each object is
+    registered in the cells overlapped by the bounding box of its rotated
+    shape. Cells are created when needed, so objects may be anywhere, even
+    out of the screen.
+    """
+
+    def __init__(self, cell_width, cell_height):
+        """
+        :Parameters:
+            `cell_width` : float
+                width of the cells, a bit more than the objects width
+            `cell_height` : float
+                height of the cells, a bit more than the objects height
+        """
+        self.cell_width = float(cell_width)
+        self.cell_height = float(cell_height)
+        self._cells = {}    # (column, row) -> set of objects
+        self._ranges = {}   # object -> (first column, last column, first row, last row)
+
+    def add(self, obj):
+        """ registers an object, or updates it if it is known """
+        self._move(obj, self._cell_range(obj))
+
+    def remove_tricky(self, obj):
+        """ forgets an object, raises KeyError when it is unknown """
+        cell_range = self._ranges.pop(obj)
+        for cell in _cells_in(cell_range):
+            self._remove_from_cell(obj, cell)
+
+    def clear(self):
+        """ forgets all the objects """
+        self._cells.clear()
+        self._ranges.clear()
+
+    def update(self, objs=None):
+        """
+        moves the objects to their new cells, after their shapes moved
+        :Parameters:
+            `objs` : the objects to update, defaults to all the known ones
+        """
+        if objs is None:
+            objs = self._ranges.keys()
+        for obj in objs:
+            cell_range = self._cell_range(obj)
+            if cell_range != self._ranges[obj]:
+                self._move(obj, cell_range)
+
+    def knows(self, obj):
+        return obj in self._ranges
+
+    def known_objs(self):
+        return self._ranges.keys()
+
+    def they_collide(self, obj1, obj2):
+        return obj1.cshape.overlaps(obj2.cshape)
+
+    def iter_colliding(self, obj):
+        """ yields the known objects colliding with obj, except obj """
+        cell_range = self._ranges.get(obj)
+        if cell_range is None:
+            cell_range = self._cell_range(obj)
+        seen = set([obj])
+        for cell in _cells_in(cell_range):
+            for other in self._cells.get(cell, ()):
+                if other not in seen:
+                    seen.add(other)
+                    if self.they_collide(obj, other):
+                        yield other
+
+    def iter_all_collisions(self):
+        """
+        yields each (obj1, obj2) pair of colliding known objects once
+        """
+        ranges = self._ranges
+        for (column, row), objs in self._cells.iteritems():
+            if len(objs) < 2:
+                continue
+            objs = list(objs)
+            for i, obj1 in enumerate(objs):
+                first_column1, _, first_row1, _ = ranges[obj1]
+                for obj2 in objs[i + 1:]:
+                    first_column2, _, first_row2, _ = ranges[obj2]
+                    # Objects sharing several cells are tested in the first
+                    # one only.
+                    if (max(first_column1, first_column2) == column
+                            and max(first_row1, first_row2) == row
+                            and self.they_collide(obj1, obj2)):
+                        yield obj1, obj2
+
+    def objs_touching_point(self, x, y):
+        """ returns the set of the known objects containing point (x, y) """
+        cell = (int(math.floor(x / self.cell_width)),
+                int(math.floor(y / self.cell_height)))
+        return set(obj for obj in self._cells.get(cell, ())
+                   if obj.cshape.touches_point(x, y))
+
+    def _cell_range(self, obj):
+        minx, maxx, miny, maxy = obj.cshape.minmax()
+        return (int(math.floor(minx / self.cell_width)),
+                int(math.floor(maxx / self.cell_width)),
+                int(math.floor(miny / self.cell_height)),
+                int(math.floor(maxy / self.cell_height)))
+
+    def _move(self, obj, cell_range):
+        old_range = self._ranges.get(obj)
+        old_cells = set(_cells_in(old_range)) if old_range else set()
+        new_cells = set(_cells_in(cell_range))
+        for cell in old_cells - new_cells:
+            self._remove_from_cell(obj, cell)
+        for cell in new_cells - old_cells:
+            self._cells.setdefault(cell, set()).add(obj)
+        self._ranges[obj] = cell_range
+
+    def _remove_from_cell(self, obj, cell):
+        objs = self._cells[cell]
+        objs.discard(obj)
+        if not objs:
+            del self._cells[cell]
+
+
+class SweepAndPruneCollisionManager(object):
+    """
+    Sweep and prune: the objects are kept sorted by the bottom of the
+    bounding box of their shape, so only the objects whose vertical
+    intervals overlap are tested against each other.
+
+    Bugs walk down at steady speeds, so their order rarely changes between
+    frames, and the insertion sort of update() runs in nearly linear time.
+    """
+
+    def __init__(self):
+        self._objs = []     # sorted by bottom
+        self._bounds = {}   # object -> (bottom, top, left, right)
+
+    def add(self, obj):
+        """ registers an object, or updates it if it is known """
+        if obj in self._bounds:
+            self.update([obj])
+            return
+        self._bounds[obj] = _bounds(obj)
+        self._objs.append(obj)
+        self._sink(len(self._objs) - 1)
+
+    def remove_tricky(self, obj):
+        """ forgets an object, raises KeyError when it is unknown """
+        del self._bounds[obj]
+        self._objs.remove(obj)
+
+    def clear(self):
+        """ forgets all the objects """
+        del self._objs[:]
+        self._bounds.clear()
+
+    def update(self, objs=None):
+        """
+        sorts the objects again, after their shapes moved
+        :Parameters:
+            `objs` : the objects to update, defaults to all the known ones
+        """
+        if objs is None:
+            objs = self._objs
+        for obj in objs:
+            self._bounds[obj] = _bounds(obj)
+        # insertion sort, the objects being nearly sorted already
+        for i in xrange(1, len(self._objs)):
+            self._sink(i)
+
+    def knows(self, obj):
+        return obj in self._bounds
+
+    def known_objs(self):
+        return list(self._objs)
+
+    def they_collide(self, obj1, obj2):
+        return obj1.cshape.overlaps(obj2.cshape)
+
+    def iter_colliding(self, obj):
+        """ yields the known objects colliding with obj, except obj """
+        bottom, top, left, right = self._bounds.get(obj) or _bounds(obj)
+        for other in self._objs:
+            other_bottom, other_top, other_left, other_right = self._bounds[other]
+            if other_bottom >= top:
+                break
+            if (other is not obj and other_top > bottom
+                    and other_left < right and left < other_right
+                    and self.they_collide(obj, other)):
+                yield other
+
+    def iter_all_collisions(self):
+        """
+        yields each (obj1, obj2) pair of colliding known objects once
+        """
+        bounds = self._bounds
+        active = []     # objects whose vertical interval may reach the next ones
+        for obj in self._objs:
+            bottom, top, left, right = bounds[obj]
+            active = [other for other in active if bounds[other][1] > bottom]
+            for other in active:
+                _, _, other_left, other_right = bounds[other]
+                if (other_left < right and left < other_right
+                        and self.they_collide(other, obj)):
+                    yield other, obj
+            active.append(obj)
+
+    def objs_touching_point(self, x, y):
+        """ returns the set of the known objects containing point (x, y) """
+        touching = set()
+        for obj in self._objs:
+            if self._bounds[obj][0] >= y:
+                break
+            if obj.cshape.touches_point(x, y):
+                touching.add(obj)
+        return touching
+
+    def _sink(self, i):
+        """ moves the object at index i down to its sorted place """
+        objs = self._objs
+        obj = objs[i]
+        bottom = self._bounds[obj][0]
+        while i > 0 and self._bounds[objs[i - 1]][0] > bottom:
+            objs[i] = objs[i - 1]
+            i -= 1
+        objs[i] = obj
+
+
+def _bounds(obj):
+    minx, maxx, miny, maxy = obj.cshape.minmax()
+    return miny, maxy, minx, maxx
+
+
+def _cells_in(cell_range):
+    first_column, last_column, first_row, last_row = cell_range
+    for column in xrange(first_column, last_column + 1):
+        for row in xrange(first_row, last_row + 1):
+            yield column, row
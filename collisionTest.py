@@ -0,0 +1,136 @@
+import unittest
+import random
+from collision import GridCollisionManager, SweepAndPruneCollisionManager
+from shapebatch import ShapeBatch
+
+
+class Thing(object):
+    """ a collidable object """
+    def __init__(self, cshape):
+        self.cshape = cshape
+
+
+class GridCollisionManagerTest (unittest.TestCase):
+
+    def setUp(self):
+        self.batch = ShapeBatch()
+        self.manager = GridCollisionManager(10, 20)
+
+    def test_iter_colliding(self):
+        thing1 = self._add(5, 5, 2, 2, 0)
+        thing2 = self._add(8, 5, 2, 2, 0)
+        thing3 = self._add(30, 5, 2, 2, 0)
+
+        self.assertEqual(list(self.manager.iter_colliding(thing1)), [thing2])
+        self.assertEqual(list(self.manager.iter_colliding(thing3)), [])
+
+    def test_update_moves_between_cells(self):
+        thing1 = self._add(5, 5, 3, 3, 0)
+        thing2 = self._add(30, 5, 2, 2, 0)
+        self.assertEqual(self.manager._ranges[thing1], (0, 0, 0, 0))
+
+        thing1.cshape.move_by(21, 0)
+        thing1.cshape.refresh()
+        self.manager.update()
+        self.assertEqual(self.manager._ranges[thing1], (2, 2, 0, 0))
+        self.assertEqual(list(self.manager.iter_colliding(thing2)), [thing1])
+        self.assertFalse((0, 0) in self.manager._cells)
+
+        thing1.cshape.rotate(45)    # bounds grow into the next column
+        thing1.cshape.refresh()
+        self.manager.update()
+        self.assertEqual(self.manager._ranges[thing1], (2, 3, 0, 0))
+
+    def test_iter_all_collisions_once(self):
+        generator = random.Random(3)
+        things = [self._add(generator.uniform(0, 50), generator.uniform(0, 50),
+                            generator.uniform(1, 8), generator.uniform(1, 8),
+                            generator.uniform(-90, 90))
+                  for i in range(40)]
+
+        pairs = list(self.manager.iter_all_collisions())
+        expected = set((thing1, thing2)
+                       for i, thing1 in enumerate(things)
+                       for thing2 in things[i + 1:]
+                       if thing1.cshape.overlaps(thing2.cshape))
+        self.assertTrue(expected)
+        self.assertEqual(len(pairs), len(expected))
+        self.assertEqual(set(frozenset(pair) for pair in pairs),
+                         set(frozenset(pair) for pair in expected))
+
+    def test_remove_and_touching_point(self):
+        thing1 = self._add(5, 5, 2, 2, 0)
+        self.assertEqual(self.manager.objs_touching_point(6, 6), set([thing1]))
+        self.assertEqual(self.manager.objs_touching_point(16, 6), set())
+
+        self.manager.remove_tricky(thing1)
+        self.assertFalse(self.manager.knows(thing1))
+        self.assertEqual(self.manager._cells, {})
+        self.assertRaises(KeyError, self.manager.remove_tricky, thing1)
+
+    def _add(self, center_x, center_y, half_width, half_height, angle):
+        thing = Thing(self.batch.add(center_x, center_y,
+                                     half_width, half_height, angle))
+        self.manager.add(thing)
+        return thing
+
+
+class SweepAndPruneCollisionManagerTest (unittest.TestCase):
+
+    def setUp(self):
+        self.batch = ShapeBatch()
+        self.manager = SweepAndPruneCollisionManager()
+
+    def test_same_collisions_as_grid(self):
+        generator = random.Random(5)
+        grid = GridCollisionManager(10, 20)
+        things = []
+        for i in range(60):
+            thing = Thing(self.batch.add(
+                    generator.uniform(0, 60), generator.uniform(0, 60),
+                    generator.uniform(1, 8), generator.uniform(1, 8),
+                    generator.uniform(-90, 90)))
+            things.append(thing)
+            self.manager.add(thing)
+            grid.add(thing)
+
+        for step in range(3):
+            pairs = list(self.manager.iter_all_collisions())
+            self.assertTrue(pairs)
+            self.assertEqual(len(pairs), len(set(frozenset(pair) for pair in pairs)))
+            self.assertEqual(set(frozenset(pair) for pair in pairs),
+                             set(frozenset(pair) for pair in grid.iter_all_collisions()))
+            for thing in things[:10]:
+                self.assertEqual(set(self.manager.iter_colliding(thing)),
+                                 set(grid.iter_colliding(thing)))
+
+            for thing in things:
+                thing.cshape.move_by(0, -generator.uniform(0, 10))
+            self.batch.update()
+            self.manager.update()
+            grid.update()
+
+    def test_update_sorts(self):
+        thing1 = self._add(5, 5, 2, 2, 0)
+        thing2 = self._add(5, 20, 2, 2, 0)
+        self.assertEqual(self.manager.known_objs(), [thing1, thing2])
+
+        thing2.cshape.move_by(0, -18)
+        thing2.cshape.refresh()
+        self.manager.update()
+        self.assertEqual(self.manager.known_objs(), [thing2, thing1])
+        self.assertEqual(list(self.manager.iter_all_collisions()), [(thing2, thing1)])
+        self.assertEqual(self.manager.objs_touching_point(5, 3.5), set([thing1, thing2]))
+
+        self.manager.remove_tricky(thing2)
+        self.assertEqual(list(self.manager.iter_colliding(thing1)), [])
+
+    def _add(self, center_x, center_y, half_width, half_height, angle):
+        thing = Thing(self.batch.add(center_x, center_y,
+                                     half_width, half_height, angle))
+        self.manager.add(thing)
+        return thing
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,8 +6,8 @@ class OrientableRectShape(object):
     """
     Implements the Cshape interface that uses rectangles with a possible rotation.
     
-    Distance is not the euclidean distance but the rectangular or max-min
-    distance, max( min(x0 - x1), min(y0 - y1) : (xi, yi) in recti )
+    Distance is the euclidean distance between the closest points of the
+    rectangles, 0 when they overlap.
     
     Good if actors rotate.
 
@@ -29,14 +29,26 @@ class OrientableRectShape(object):
         self.half_width = half_width
         self.half_height = half_height
         self.center = center
+        # the corners are allocated once, then updated in place
+        self.unrotated_A = Point()
+        self.unrotated_B = Point()
+        self.unrotated_C = Point()
+        self.unrotated_D = Point()
+        self.A = Point()
+        self.B = Point()
+        self.C = Point()
+        self.D = Point()
+        self._set_angle(angle)
         self.update_position()
-        self.rotate(angle)
 
     def update_position(self):
-        self.unrotated_A = Point(self.center.x - self.half_width, self.center.y + self.half_height)
-        self.unrotated_B = Point(self.center.x + self.half_width, self.center.y + self.half_height)
-        self.unrotated_C = Point(self.center.x + self.half_width, self.center.y - self.half_height)
-        self.unrotated_D = Point(self.center.x - self.half_width, self.center.y - self.half_height)
+        ''' computes the corners after the center was changed '''
+        x, y = self.center.x, self.center.y
+        self.unrotated_A.move_to(x - self.half_width, y + self.half_height)
+        self.unrotated_B.move_to(x + self.half_width, y + self.half_height)
+        self.unrotated_C.move_to(x + self.half_width, y - self.half_height)
+        self.unrotated_D.move_to(x - self.half_width, y - self.half_height)
+        self._rotate_corners()
 
     def move_by(self, dx, dy):
         ''' moves the shape
@@ -72,12 +84,29 @@ class OrientableRectShape(object):
             'angle': float
                 the new rotation of the shape, in degrees
         """        
+        if angle != self.angle:
+            self._set_angle(angle)
+            self._rotate_corners()
+
+    def _set_angle(self, angle):
         self.angle = angle
         rad = math.radians(angle)
-        self.A = self.unrotated_A.rotate_about(self.center, rad)
-        self.B = self.unrotated_B.rotate_about(self.center, rad)
-        self.C = self.unrotated_C.rotate_about(self.center, rad)
-        self.D = self.unrotated_D.rotate_about(self.center, rad)
+        self._sin = math.sin(rad)
+        self._cos = math.cos(rad)
+
+    def _rotate_corners(self):
+        """ rotates the unrotated corners into A, B, C, D, in place """
+        for unrotated, corner in ((self.unrotated_A, self.A),
+                                  (self.unrotated_B, self.B),
+                                  (self.unrotated_C, self.C),
+                                  (self.unrotated_D, self.D)):
+            corner.move_to(unrotated.x, unrotated.y)
+            corner.rotate_about_inplace(self.center, self._sin, self._cos)
+
+    def corners(self):
+        """ :rtype: list of the [x, y] coordinates of A, B, C, D """
+        return [[self.A.x, self.A.y], [self.B.x, self.B.y],
+                [self.C.x, self.C.y], [self.D.x, self.D.y]]
 
     def _get_triangle_area(self, A,B,C):
         """
@@ -102,48 +131,16 @@ class OrientableRectShape(object):
         return (p1.x - p2.x)**2 + (p1.y - p2.y)**2
 
     def overlaps(self, other):
-        if self == other:
+        if self is other:
             return False
-        
-        return (self.touches(other.center)
-             or self.touches(other.A)
-             or self.touches(other.B)
-             or self.touches(other.C)
-             or self.touches(other.D)
-             or other.touches(self.center)
-             or other.touches(self.A)
-             or other.touches(self.B)
-             or other.touches(self.C)
-             or other.touches(self.D))
+
+        return shapes_overlap(self, other)
 
     def distance(self, other):
-        """
-            TODO: find some optimization
-        """
-        square_distance = min(self._get_square_distance(self.A, other.A),
-                              self._get_square_distance(self.A, other.B),
-                              self._get_square_distance(self.A, other.C),
-                              self._get_square_distance(self.A, other.D),
-                              self._get_square_distance(self.B, other.A),
-                              self._get_square_distance(self.B, other.B),
-                              self._get_square_distance(self.B, other.C),
-                              self._get_square_distance(self.B, other.D),
-                              self._get_square_distance(self.C, other.A),
-                              self._get_square_distance(self.C, other.B),
-                              self._get_square_distance(self.C, other.C),
-                              self._get_square_distance(self.C, other.D),
-                              self._get_square_distance(self.D, other.A),
-                              self._get_square_distance(self.D, other.B),
-                              self._get_square_distance(self.D, other.C),
-                              self._get_square_distance(self.D, other.D))
-        if square_distance < 0.0:
-            result = 0.0
-        else:
-            result = math.sqrt(square_distance)
-        return result
-    
+        return math.sqrt(shapes_square_distance(self, other))
+
     def near_than(self, other, near_distance):
-        return self.distance(other) <= near_distance
+        return shapes_near(self, other, near_distance)
 
     def touches_point(self, x, y):        
         P = Point(x, y)
@@ -175,3 +172,91 @@ class OrientableRectShape(object):
                                               self.angle) 
     def __repr__(self):
         return self.A.__repr__() + " " + self.B.__repr__() + " " + self.C.__repr__() + " " + self.D.__repr__()
+
+
+def shapes_overlap(shape, other):
+    """
+        Overlap test of two rectangular Cshapes having corners():
+        bounding boxes first, then rectangles_overlap.
+    """
+    minmax = shape.minmax()
+    other_minmax = other.minmax()
+    if (minmax[1] <= other_minmax[0] or other_minmax[1] <= minmax[0]
+        or minmax[3] <= other_minmax[2] or other_minmax[3] <= minmax[2]):
+        return False    # bounding boxes apart
+    return rectangles_overlap(shape.corners(), other.corners())
+
+
+def shapes_square_distance(shape, other):
+    """
+        Square of the euclidean distance between two rectangular Cshapes
+        having corners(), 0 when they overlap.
+    """
+    if shapes_overlap(shape, other):
+        return 0.0
+    corners = shape.corners()
+    other_corners = other.corners()
+    return min(_square_distance_to_edges(corners, other_corners),
+               _square_distance_to_edges(other_corners, corners))
+
+
+def shapes_near(shape, other, near_distance):
+    """
+        Whether two rectangular Cshapes having corners() are closer than
+        near_distance. Compares square distances, after a bounding boxes test.
+    """
+    minmax = shape.minmax()
+    other_minmax = other.minmax()
+    dx = max(0.0, other_minmax[0] - minmax[1], minmax[0] - other_minmax[1])
+    dy = max(0.0, other_minmax[2] - minmax[3], minmax[2] - other_minmax[3])
+    square_near_distance = near_distance * near_distance
+    if dx * dx + dy * dy > square_near_distance:
+        return False    # bounding boxes too far
+    return shapes_square_distance(shape, other) <= square_near_distance
+
+
+def _square_distance_to_edges(points, corners):
+    """
+        :rtype: float
+            the smallest square distance from the points to the edges of the
+            polygon made by corners
+    """
+    result = None
+    previous_x, previous_y = corners[-1]
+    for x, y in corners:
+        ex, ey = x - previous_x, y - previous_y
+        square_length = ex * ex + ey * ey
+        for px, py in points:
+            # closest point of the edge: projection clamped to the edge ends
+            t = 0.0
+            if square_length > 0:
+                t = ((px - previous_x) * ex + (py - previous_y) * ey) / square_length
+                t = min(1.0, max(0.0, t))
+            dx = previous_x + t * ex - px
+            dy = previous_y + t * ey - py
+            square_distance = dx * dx + dy * dy
+            if result is None or square_distance < result:
+                result = square_distance
+        previous_x, previous_y = x, y
+    return result
+
+
+def rectangles_overlap(corners1, corners2):
+    """
+        Separating axis test: two rectangles overlap unless the projections
+        of their corners on one of their edges directions are apart.
+        Rectangles touching by an edge or a corner do not overlap.
+
+        :Parameters:
+            'corners1' : list of the [x, y] coordinates of 4 consecutive corners
+            'corners2' : list of the [x, y] coordinates of 4 consecutive corners
+        :rtype: bool
+    """
+    for corners in (corners1, corners2):
+        (ax, ay), (bx, by), (cx, cy) = corners[0], corners[1], corners[2]
+        for nx, ny in ((bx - ax, by - ay), (cx - bx, cy - by)):
+            p1 = [nx * x + ny * y for x, y in corners1]
+            p2 = [nx * x + ny * y for x, y in corners2]
+            if max(p1) <= min(p2) or max(p2) <= min(p1):
+                return False
+    return True
@@ -0,0 +1,38 @@
+"""
+argb.py
+
+Conversion of kinect buffers to 32 bits images, in cairo FORMAT_ARGB32
+byte order (b, g, r, a on little endian machines).
+
+"""
+
+import numpy
+
+from kinect import _UNDEF_DEPTH
+
+__all__ = ['rgb_to_argb32', 'depth_to_argb32']
+
+
+def rgb_to_argb32(rgb):
+    "from a (h, w, 3) rgb buffer, returns a (h, w, 4) uint8 image"
+    alpha_channel = numpy.ones(rgb.shape[:2] + (1,), dtype=numpy.uint8) * 255
+    rgb32 = numpy.concatenate((alpha_channel, rgb), axis=2)
+    return rgb32[:, :, ::-1].astype(numpy.uint8)
+
+
+def depth_to_argb32(depth):
+    '''from a (h, w) depth buffer, returns a (h, w, 4) uint8 image
+    close is light, far is dark, undefined depth is blue'''
+    alpha_channel = numpy.ones(depth.shape + (1,), dtype=numpy.uint8) * 255
+
+    # Take care of special NaN value.
+    i = numpy.amin(depth)
+    depth_clean = numpy.where(depth == _UNDEF_DEPTH, 0, depth)
+    a = numpy.amax(depth_clean)
+    depth = numpy.where(
+            depth == _UNDEF_DEPTH,
+            0,
+            255 - (depth - i) * 254.0 / (a - i))
+    depth32 = numpy.dstack((
+        alpha_channel, depth, numpy.where(depth == 0, 128, depth), depth))
+    return depth32[:, :, ::-1].astype(numpy.uint8)
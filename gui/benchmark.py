@@ -0,0 +1,257 @@
+"""
+benchmark.py
+
+Measures the kinect obstacle pipeline, stage by stage.
+
+Every stage runs over the saved recordings of this directory and over
+synthetic frames with several players standing in the analysis band. Latency
+percentiles are reported in milliseconds, with the numpy array data that a
+call allocates, temporaries included. Results can be saved as a baseline, and
+compared with a previous baseline.
+
+usage: python benchmark.py [-n ITERATIONS] [--players N] [--save FILE]
+                           [--compare FILE] [--tolerance RATIO]
+"""
+
+import argparse
+import ctypes
+import glob
+import json
+import os
+import sys
+import timeit
+from collections import namedtuple
+
+import numpy
+
+import kinect
+from argb import rgb_to_argb32, depth_to_argb32
+
+__all__ = ['recorded_frames', 'synthetic_frame', 'STAGES', 'run', 'compare']
+
+FRAME_BUDGET = 33.0  # ms, at 30 frames per second
+
+# A benchmarked frame, with the intermediate results that stages start from.
+BenchFrame = namedtuple('BenchFrame', 'name depth rgb dist borders')
+
+
+def _band_slice(band=kinect._DEFAULT_ANALYSIS_BAND):
+    bx, by, bw, bh = band
+    return slice(by, by + bh), slice(bx, bx + bw)
+
+_BAND = _band_slice()
+
+# (name, function of a BenchFrame)
+STAGES = [
+    ('z_to_cm frame', lambda f: kinect.z_to_cm(f.depth)),
+    ('z_to_cm band', lambda f: kinect.z_to_cm(f.depth[_BAND])),
+    ('extract_borders', lambda f: kinect.extract_borders(f.dist)),
+    ('segment_borders', lambda f: kinect.segment_borders(*f.borders)),
+    ('extract_obstacles', lambda f: kinect.extract_obstacles(f.depth)),
+    ('refresh_data images', lambda f: (rgb_to_argb32(f.rgb), depth_to_argb32(f.depth))),
+    ]
+
+
+def _bench_frame(name, depth, rgb):
+    dist = kinect.z_to_cm(depth)
+    return BenchFrame(name, depth, rgb, dist, kinect.extract_borders(dist))
+
+
+def recorded_frames(directory=kinect._DATA_DIR):
+    "returns the BenchFrames of the saved recordings of directory"
+    frames = []
+    for depth_file in sorted(glob.glob(os.path.join(directory, '*_depth.npy'))):
+        base = depth_file[:-len('_depth.npy')]
+        frames.append(_bench_frame(os.path.basename(base),
+                                   numpy.load(depth_file),
+                                   numpy.load(base + '_rgb.npy')))
+    return frames
+
+
+def synthetic_frame(background, players, random, band=kinect._DEFAULT_ANALYSIS_BAND):
+    '''returns a BenchFrame made of background with players standing in band
+    background: a recorded BenchFrame
+    players: number of players, two feet each
+    random: a numpy.random.RandomState'''
+    depth = background.depth.copy()
+    bx, by, bw, bh = band
+    min_depth, max_depth = kinect.raw_depth_range()
+    foot_width = 20
+    for _ in range(2 * players):
+        x = bx + random.randint(0, bw - foot_width)
+        bottom = by + random.randint(bh // 2, bh)
+        z = random.randint(min_depth, max_depth)
+        depth[:bottom, x:x + foot_width] = z + random.randint(-2, 3, (bottom, foot_width))
+    return _bench_frame('%s + %d players' % (background.name, players),
+                        depth, background.rgb)
+
+
+# Array data allocations are seen through PyDataMem_SetEventHook, function
+# 291 of the numpy C API table. Its hook is called, with the GIL held, when
+# array data is allocated, reallocated or released.
+_SET_EVENT_HOOK_INDEX = 291
+_EventHook = ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.c_void_p,
+                              ctypes.c_size_t, ctypes.c_void_p)
+
+
+def _set_event_hook_function():
+    "returns the numpy PyDataMem_SetEventHook function, or None if it is missing"
+    if int(numpy.__version__.split('.')[0]) >= 2:
+        return None     # removed from numpy 2
+    try:
+        api = numpy.core.multiarray._ARRAY_API
+        if type(api).__name__ == 'PyCObject':   # Python 2
+            as_pointer = ctypes.pythonapi.PyCObject_AsVoidPtr
+            as_pointer.argtypes = [ctypes.py_object]
+            args = (api,)
+        else:
+            as_pointer = ctypes.pythonapi.PyCapsule_GetPointer
+            as_pointer.argtypes = [ctypes.py_object, ctypes.c_char_p]
+            args = (api, None)
+        as_pointer.restype = ctypes.c_void_p
+        table = ctypes.cast(as_pointer(*args), ctypes.POINTER(ctypes.c_void_p))
+    except (AttributeError, ValueError):
+        return None
+    return ctypes.CFUNCTYPE(ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p,
+                            ctypes.c_void_p)(table[_SET_EVENT_HOOK_INDEX])
+
+_SET_EVENT_HOOK = _set_event_hook_function()
+
+
+class _AllocationCounter(object):
+    '''Counts the numpy array data allocations made within a with block.
+    Small buffers which numpy serves from its own cache are not seen.'''
+
+    def __init__(self):
+        self.count = 0
+        self.bytes = 0
+        self._hook = _EventHook(self._event)
+        self._previous = None
+
+    def __enter__(self):
+        self._previous = _SET_EVENT_HOOK(ctypes.cast(self._hook, ctypes.c_void_p),
+                                         None, None)
+        return self
+
+    def __exit__(self, *exc_info):
+        _SET_EVENT_HOOK(self._previous, None, None)
+
+    def _event(self, old, new, size, user_data):
+        if new:     # allocated or reallocated, not released
+            self.count += 1
+            self.bytes += size
+
+
+def _measure(function, frame, iterations):
+    '''returns the durations in ms, and the number and bytes of the numpy
+    allocations of a call, or None, None if they cannot be counted'''
+    function(frame)  # warm up
+    durations = []
+    for _ in range(iterations):
+        start = timeit.default_timer()
+        function(frame)
+        durations.append((timeit.default_timer() - start) * 1000.0)
+
+    if not _SET_EVENT_HOOK:
+        return durations, None, None
+    # Apart from the timed calls: the hook is called back in python.
+    with _AllocationCounter() as counter:
+        function(frame)
+    return durations, counter.count, counter.bytes
+
+
+def run(frames, iterations=50):
+    '''runs all the STAGES over all the frames
+    returns {stage name: {'p50': ms, 'p90': ms, 'p99': ms, 'max': ms,
+                          'allocs': count, 'alloc_bytes': bytes}}
+    allocs and alloc_bytes are the numpy array data allocations of a call, the
+    most over the frames, temporaries included. None when numpy cannot report
+    them'''
+    results = {}
+    for name, function in STAGES:
+        durations = []
+        allocs = allocated = None
+        for frame in frames:
+            frame_durations, frame_allocs, frame_allocated = _measure(
+                    function, frame, iterations)
+            durations.extend(frame_durations)
+            if frame_allocs is not None and frame_allocated >= allocated:
+                allocs, allocated = frame_allocs, frame_allocated
+        p50, p90, p99 = numpy.percentile(durations, [50, 90, 99])
+        results[name] = {'p50': p50, 'p90': p90, 'p99': p99,
+                         'max': max(durations), 'allocs': allocs,
+                         'alloc_bytes': allocated}
+    return results
+
+
+def compare(results, baseline, tolerance=0.1):
+    '''returns the names of the stages whose median latency is worse than the
+    baseline one by more than tolerance (a ratio)'''
+    return [name for name, _ in STAGES
+            if name in results and name in baseline
+            and results[name]['p50'] > baseline[name]['p50'] * (1.0 + tolerance)]
+
+
+def _report(results, baseline=None):
+    print '%-22s %8s %8s %8s %8s %7s %10s %10s' % (
+            'stage', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms', 'allocs', 'alloc KiB',
+            'vs base')
+    for name, _ in STAGES:
+        result = results[name]
+        if result['allocs'] is None:
+            allocs = '%7s %10s' % ('n/a', 'n/a')
+        else:
+            allocs = '%7d %10.1f' % (result['allocs'], result['alloc_bytes'] / 1024.0)
+        ratio = ''
+        if baseline and name in baseline:
+            ratio = '%+9.0f%%' % ((result['p50'] / baseline[name]['p50'] - 1) * 100)
+        print '%-22s %8.3f %8.3f %8.3f %8.3f %s %10s' % (
+                name, result['p50'], result['p90'], result['p99'], result['max'],
+                allocs, ratio)
+
+    p99 = results['extract_obstacles']['p99']
+    print
+    print 'extract_obstacles p99: %.3f ms, %s the %d ms frame budget' % (
+            p99, 'within' if p99 <= FRAME_BUDGET else 'OVER', FRAME_BUDGET)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmark the kinect obstacle pipeline.')
+    parser.add_argument('-n', '--iterations', type=int, default=50,
+                        help='runs of every stage on every frame')
+    parser.add_argument('--players', type=int, default=4,
+                        help='players in the synthetic frames')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the synthetic frames')
+    parser.add_argument('--save', metavar='FILE', help='save results as a baseline')
+    parser.add_argument('--compare', metavar='FILE', help='compare with a baseline')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='accepted median slow down, as a ratio')
+    options = parser.parse_args(argv)
+
+    random = numpy.random.RandomState(options.seed)
+    frames = recorded_frames()
+    frames += [synthetic_frame(frame, options.players, random) for frame in frames]
+
+    results = run(frames, options.iterations)
+
+    baseline = None
+    if options.compare:
+        with open(options.compare) as f:
+            baseline = json.load(f)
+    _report(results, baseline)
+
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if baseline:
+        slower = compare(results, baseline, options.tolerance)
+        if slower:
+            print 'Slower than baseline:', ', '.join(slower)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
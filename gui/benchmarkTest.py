@@ -0,0 +1,50 @@
+import unittest
+import numpy
+import kinect
+import benchmark
+
+
+class BenchmarkTest (unittest.TestCase):
+
+    def test_synthetic_frame_adds_players(self):
+        background, = [frame for frame in benchmark.recorded_frames()
+                       if frame.name == '2012-03-02_14-36-48']
+        frame = benchmark.synthetic_frame(background, 3, numpy.random.RandomState(1))
+
+        self.assertTrue(len(kinect.extract_obstacles(frame.depth))
+                        > len(kinect.extract_obstacles(background.depth)))
+        self.assertEqual(frame.depth.dtype, background.depth.dtype)
+
+    def test_run_all_stages(self):
+        frames = benchmark.recorded_frames()[:1]
+        results = benchmark.run(frames, iterations=2)
+        self.assertEqual(sorted(results), sorted(name for name, _ in benchmark.STAGES))
+        for result in results.values():
+            self.assertTrue(0 <= result['p50'] <= result['p99'] <= result['max'])
+
+    def test_allocations_counted(self):
+        if benchmark._SET_EVENT_HOOK is None:
+            return      # numpy cannot report them
+        frames = benchmark.recorded_frames()[:1]
+        results = benchmark.run(frames, iterations=1)
+        self.assertTrue(results['z_to_cm frame']['alloc_bytes']
+                        >= frames[0].depth.size * 8)
+        # temporaries, while the obstacles hold no array
+        self.assertTrue(results['extract_obstacles']['allocs'] > 1)
+        self.assertTrue(results['segment_borders']['alloc_bytes'] > 0)
+
+        with benchmark._AllocationCounter() as counter:
+            numpy.empty(1000)
+        self.assertEqual((counter.count, counter.bytes), (1, 8000))
+        with benchmark._AllocationCounter() as counter:
+            pass
+        self.assertEqual(counter.count, 0)
+
+    def test_compare(self):
+        baseline = {'extract_obstacles': {'p50': 1.0}, 'z_to_cm band': {'p50': 1.0}}
+        results = {'extract_obstacles': {'p50': 1.05}, 'z_to_cm band': {'p50': 1.5}}
+        self.assertEqual(benchmark.compare(results, baseline, 0.1), ['z_to_cm band'])
+
+
+if __name__ == '__main__':
+    unittest.main()
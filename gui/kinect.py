@@ -5,7 +5,9 @@ Interface to the kinect hardware.
 
 """
 
+import os
 import time
+import threading
 from collections import namedtuple
 import numpy
 
@@ -15,12 +17,14 @@ except ImportError:
     freenect = None
     print "Kinect module not found. Faking it"
 
-__all__ = ['get_buffers','set_default_data','z_to_cm','x_to_cm','y_to_cm','extract_obstacles','get_obstacles']
+__all__ = ['get_buffers','get_frame','LazyKinectData','set_default_data','file_source','FrameGrabber','start_acquisition','stop_acquisition','z_to_cm','x_to_cm','y_to_cm','raw_depth_range','extract_borders','segment_borders','extract_obstacles','get_obstacles']
 
 _DEFAULT_ANALYSIS_BAND = (37, 196, 566, 85)
 _DEFAULT_SURFACE = (-9999, -9999, 9999, 9999)
 
-_DEFAULT_FILE = '2012-03-02_14-36-48'
+# The saved frames lie next to this file.
+_DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+_DEFAULT_FILE = os.path.join(_DATA_DIR, '2012-03-02_14-36-48')
 
 
 _UNDEF_DEPTH = 2047
@@ -42,18 +46,51 @@ _DIST_ARRAY = numpy.where(
         _DIST_ARRAY < _MAX_DISTANCE,
         _DIST_ARRAY,
         _UNDEF_DISTANCE)
+# Conversion tables by output type.
+_DIST_ARRAYS = {
+        numpy.dtype(numpy.float64): _DIST_ARRAY,
+        numpy.dtype(numpy.float32): _DIST_ARRAY.astype(numpy.float32),
+        }
 
 
 # ----------------------------------------------
 # Returned by get_buffers
 KinectData = namedtuple('KinectData', 'real_kinect rgb depth')
-_DEFAULT_DATA = KinectData(
+
+
+def _load_data(filename):
+    "loads a saved frame, filename without extension"
+    return KinectData(
         real_kinect=False,
-        rgb=numpy.load(_DEFAULT_FILE + '_rgb.npy'),
-        depth=numpy.load(_DEFAULT_FILE + '_depth.npy')
+        rgb=numpy.load(filename + '_rgb.npy'),
+        depth=numpy.load(filename + '_depth.npy')
         )
-def get_buffers():
-    '''get_buffers(): returns a KinectData object
+
+_DEFAULT_DATA = _load_data(_DEFAULT_FILE)
+
+
+class LazyKinectData(object):
+    '''KinectData variant whose rgb array is only fetched when first read.
+    Returned when the depth only is asked for.'''
+    __slots__ = ('real_kinect', 'depth', '_rgb', '_fetch_rgb')
+
+    def __init__(self, real_kinect, depth, fetch_rgb):
+        '''fetch_rgb: function returning the rgb array'''
+        self.real_kinect = real_kinect
+        self.depth = depth
+        self._rgb = None
+        self._fetch_rgb = fetch_rgb
+
+    @property
+    def rgb(self):
+        if self._fetch_rgb:
+            self._rgb = self._fetch_rgb()
+            self._fetch_rgb = None
+        return self._rgb
+
+
+def get_buffers(depth_only=False):
+    '''get_buffers(depth_only=False): returns a KinectData object
     KinectData members:
      - real_kinect (boolean) (true if data comes fro ma real kinect)
      - rgb array
@@ -63,7 +100,18 @@ def get_buffers():
 
      the input is taken from a file if the kinect is missing or the library not present.
      no memorization is done
+
+     depth_only: do not fetch the video stream from the kinect. A
+     LazyKinectData is returned, its rgb is fetched on demand
+
+     when the acquisition is started (see start_acquisition), the latest
+     grabbed frame is returned instead, without waiting for the kinect.
      '''
+    return get_frame(depth_only).data
+
+
+def _read_kinect():
+    "reads one frame from the kinect, or returns the default data if it is missing"
     found_kinect = False
 
     if freenect: # module has been imported
@@ -81,21 +129,241 @@ def get_buffers():
         return _DEFAULT_DATA
 
 
+def _read_kinect_depth():
+    "reads the depth only from the kinect, or returns the default data if it is missing"
+    if freenect: # module has been imported
+        try:
+            depth, _ = freenect.sync_get_depth()
+            return LazyKinectData(real_kinect=True, depth=depth,
+                                  fetch_rgb=_read_kinect_video)
+        except TypeError:
+            pass
+
+    # Use local data files.
+    return _DEFAULT_DATA
+
+
+def _read_kinect_video():
+    rgb, _ = freenect.sync_get_video()
+    return rgb
+
+
 def set_default_data(filename):
     '''Sets default fake input file to use, without extension
-     ex: 2012-03-02_14-36-48'''
-
+     ex: 2012-03-02_14-36-48
+     a bare name is looked for next to this module when it is not found
+     in the current directory'''
+    global _DEFAULT_FILE, _DEFAULT_DATA
+
+    if not os.path.exists(filename + '_depth.npy'):
+        filename = os.path.join(_DATA_DIR, filename)
+    _DEFAULT_DATA = _load_data(filename)
     _DEFAULT_FILE = filename
-    _DEFAULT_DATA = KinectData(
-        real_kinect=False,
-        rgb=numpy.load(self._filename + '_rgb.npy'),
-        depth=numpy.load(self._filename + '_depth.npy')
-        )
 
 
-def z_to_cm(depth):
-    "from a depth (or depth buffer), convert to depth in centimeters"
-    return _DIST_ARRAY[depth]
+# ----------------------------------------------
+# Background acquisition
+
+# Returned by get_frame and FrameGrabber.latest
+#
+# seq           Frame number, starting from 1, 0 if not grabbed in background. Int
+# timestamp     Acquisition time, as returned by time.time(). Float
+# data          The frame buffers. KinectData
+Frame = namedtuple('Frame', 'seq timestamp data')
+
+_KINECT_FPS = 30.0
+# get_frame reads directly if the acquisition has no frame after this delay (s)
+_FIRST_FRAME_TIMEOUT = 1.0
+
+
+def _pacer(fps):
+    "returns a function sleeping until the next tick of a fps clock"
+    period = 1.0 / fps
+    next_time = [time.time()]
+
+    def wait():
+        delay = next_time[0] - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        next_time[0] = max(next_time[0], time.time() - period) + period
+    return wait
+
+
+def file_source(filename, fps=_KINECT_FPS):
+    '''Returns a fake kinect source, for FrameGrabber, that repeats a saved frame
+    file_source(filename, fps=30.0):
+        filename: saved frame, without extension ex: 2012-03-02_14-36-48
+        fps: frames per second delivered, like the kinect does
+    '''
+    data = _load_data(filename)
+    wait = _pacer(fps)
+
+    def read():
+        wait()
+        return data
+    return read
+
+
+def _kinect_source(depth_only=False):
+    '''the default FrameGrabber source: reads the kinect, which blocks until
+    a frame is ready. The default data, returned at once when the kinect is
+    missing, is delivered at the kinect frame rate instead'''
+    read_kinect = _read_kinect_depth if depth_only else _read_kinect
+    wait = _pacer(_KINECT_FPS)
+
+    def read():
+        data = read_kinect()
+        if not data.real_kinect:
+            wait()
+        return data
+    return read
+
+
+class FrameGrabber(object):
+    '''Pulls frames from a source in a background thread.
+
+    The frames are copied into a small ring of buffers, allocated once, so the
+    latest complete frame can be read at any time without waiting for the source.
+    A returned frame stays valid while the grabber fills the ring_size - 1
+    other buffers: copy it to keep it longer.
+    In depth only mode, just the depth is copied and frames hold a
+    LazyKinectData, whose rgb is taken from the source when read.
+    Consumers which need every frame, like a recorder, get them from the
+    on_frame hook instead of polling latest.
+    '''
+
+    def __init__(self, source=None, ring_size=3, depth_only=False, on_frame=None):
+        '''source: function returning a KinectData, blocking until a frame is available
+                   or None when there is no more frame. Defaults to the kinect
+           ring_size: number of frame buffers, at least 2
+           depth_only: whether to skip the rgb array
+           on_frame: optional function called with every new Frame, from the
+                     grabber thread. The frame must be copied to be kept'''
+        if source is None:
+            source = _kinect_source(depth_only)
+        self._source = source
+        self._depth_only = depth_only
+        self._on_frame = on_frame
+        self._ring = [None] * max(ring_size, 2)
+        self._latest = None
+        self._lock = threading.Lock()
+        self._first_frame = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        ''' starts grabbing frames '''
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='FrameGrabber')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        ''' stops grabbing frames and waits for the thread to finish '''
+        self._running = False
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def is_running(self):
+        return self._running
+
+    def latest(self, timeout=None):
+        '''returns the latest complete Frame
+           waits for the first frame only, at most timeout seconds, and
+           returns None if there is still none'''
+        self._first_frame.wait(timeout)
+        with self._lock:
+            return self._latest
+
+    def _run(self):
+        try:
+            self._grab()
+        finally:
+            # Source exhausted or failing: do not wait for frames that will never come.
+            self._running = False
+            self._first_frame.set()
+
+    def _grab(self):
+        seq = 0
+        index = 0
+        while self._running:
+            data = self._source()
+            if data is None:
+                break
+            timestamp = time.time()
+            seq += 1
+            index = (index + 1) % len(self._ring)
+            buffers = self._ring[index]
+            if buffers is None or buffers.depth.shape != data.depth.shape:
+                buffers = KinectData(
+                        real_kinect=False,
+                        rgb=None if self._depth_only else numpy.empty_like(data.rgb),
+                        depth=numpy.empty_like(data.depth))
+                self._ring[index] = buffers
+            numpy.copyto(buffers.depth, data.depth)
+
+            if self._depth_only:
+                frame_data = LazyKinectData(real_kinect=data.real_kinect,
+                                            depth=buffers.depth,
+                                            fetch_rgb=lambda data=data: data.rgb)
+            else:
+                numpy.copyto(buffers.rgb, data.rgb)
+                frame_data = buffers._replace(real_kinect=data.real_kinect)
+            frame = Frame(seq=seq, timestamp=timestamp, data=frame_data)
+            with self._lock:
+                self._latest = frame
+            self._first_frame.set()
+            if self._on_frame:
+                self._on_frame(frame)
+
+
+_GRABBER = None
+
+
+def start_acquisition(source=None, ring_size=3, depth_only=False, on_frame=None):
+    '''Starts grabbing frames in background. get_buffers, get_frame and
+    get_obstacles then return the latest frame without blocking.
+    See FrameGrabber for parameters.'''
+    global _GRABBER
+    stop_acquisition()
+    _GRABBER = FrameGrabber(source, ring_size, depth_only, on_frame)
+    _GRABBER.start()
+
+
+def stop_acquisition():
+    '''Stops the background acquisition, if any'''
+    global _GRABBER
+    if _GRABBER:
+        _GRABBER.stop()
+        _GRABBER = None
+
+
+def get_frame(depth_only=False):
+    '''returns the latest Frame when the acquisition is started,
+    otherwise reads a new one. See get_buffers
+    a new frame is read as well if the acquisition grabbed none within
+    _FIRST_FRAME_TIMEOUT seconds, ex when its source is exhausted at once'''
+    if _GRABBER:
+        frame = _GRABBER.latest(_FIRST_FRAME_TIMEOUT)
+        if frame is not None:
+            return frame
+    data = _read_kinect_depth() if depth_only else _read_kinect()
+    return Frame(seq=0, timestamp=time.time(), data=data)
+
+
+def z_to_cm(depth, out=None, dtype=numpy.float64):
+    """from a depth (or depth buffer), convert to depth in centimeters
+    out: optional buffer, of the depth buffer shape, receiving the result
+    dtype: numpy.float64 or numpy.float32, the type of out when given
+    Raw depths above 2047, which the kinect never returns, are read as 2047
+    (undefined): in the default 'raise' mode, take would fill a temporary
+    copy of out rather than out itself."""
+    if out is not None:
+        dtype = out.dtype
+    return numpy.take(_DIST_ARRAYS[numpy.dtype(dtype)], depth, out=out, mode='clip')
 
 
 def x_to_cm(x, z):
@@ -120,14 +388,117 @@ def y_to_cm(y, z):
 
 Obstacle = namedtuple('Obstacle', 'x y width height z raw_data')
 
+_MAX_DEPTH = 300.0  # 3 meters. FIXME Depends on Gaming Zone size.
+_MAX_BORDER_HEIGHT = 10  # pixels. a foot can never be higher than this. Restrict accordingly
+_MAX_Z_CHANGE = 10 # cm. consider discutinued foot if Z varies this much or more
+
+
+def extract_borders(dist, band=_DEFAULT_ANALYSIS_BAND, max_depth=_MAX_DEPTH):
+    '''Returns the lower border of what stands in the analysis band
+    extract_borders(dist, band=..., max_depth=...):
+        dist: distance array in centimeters (see z_to_cm)
+        band: an optional analysis band in pixels (x, y, w, h)
+        max_depth: distances above this are ignored, in centimeters
+
+        returns a (x, ymax, z) tuple of arrays, one item per non-empty column.
+        ymax is the max Y of the column where z is in range, x and ymax in pixels,
+        z@ymax in cm.
+
+    All the columns are processed at once: the lowest in-range row is the first
+    True value of the in-range mask when read upside down.
+    '''
+    bx, by, bw, bh = band
+    zone = dist[by:by + bh, bx:bx + bw] #extract zone from which data is considered
+    return _zone_borders(zone, bx, by, max_depth)
+
+
+def _zone_borders(zone, bx, by, max_depth=_MAX_DEPTH):
+    "extract_borders for an analysis band already cut at (bx, by)"
+    columns, ymax = _lowest_rows(zone <= max_depth)
+    return bx + columns, by + ymax, zone[ymax, columns]
+
+
+def _lowest_rows(in_range):
+    "returns the non-empty columns of the in_range mask, and their lowest True row"
+    columns = numpy.flatnonzero(in_range.any(axis=0))  # is there any z in the range ?
+    ymax = in_range.shape[0] - 1 - numpy.argmax(in_range[::-1, columns], axis=0)
+    return columns, ymax
+
+
+def raw_depth_range(max_depth=_MAX_DEPTH):
+    '''Returns the (min, max) raw depth values whose distance is in range,
+    that is between _MIN_DISTANCE and both _MAX_DISTANCE and max_depth (cm).
+    As the raw depth to cm conversion is monotonic in range, raw depths can be
+    tested against these bounds instead of being converted.
+    When no raw depth is in range, ex max_depth below _MIN_DISTANCE, the empty
+    range (1, 0) is returned: nothing is found within it.'''
+    in_range = numpy.flatnonzero(_DIST_ARRAY <= max_depth)
+    if not in_range.size:
+        return 1, 0
+    return in_range[0], in_range[-1]
+
+_RAW_DEPTH_RANGE = raw_depth_range()
+
 
-def extract_obstacles(depth, band=_DEFAULT_ANALYSIS_BAND, surface=_DEFAULT_SURFACE, provide_raw=False):
+def segment_borders(xs, ys, zs, provide_raw=False):
+    '''Splits borders into feet and returns them as Obstacles
+    segment_borders(xs, ys, zs, provide_raw=False):
+        xs, ys, zs: border arrays, as returned by extract_borders
+        provide_raw : whether to provide raw data in the returned object or None
+
+        returns a list of Obstacles objects, see extract_obstacles
+
+    A foot is made of contiguous X without too abrupt z change. Only its lower
+    part is kept: points more than _MAX_BORDER_HEIGHT pixels above the foot
+    bottom are dropped.
+    Works on the arrays as a whole: discontinuities are found with diff,
+    foot ids with cumsum and per foot bounds with reduceat.
+    '''
+    if not xs.size:
+        return []
+
+    # Separate disconnected feet.
+    new_foot = numpy.empty(xs.size, dtype=bool)
+    new_foot[0] = True
+    new_foot[1:] = (numpy.diff(xs) > 1) | (numpy.abs(numpy.diff(zs)) >= _MAX_Z_CHANGE)
+    foot_ids = numpy.cumsum(new_foot) - 1
+    starts = numpy.flatnonzero(new_foot)
+
+    # Limit zone height : distance between base and top must be restricted. shrink foot accordingly
+    bottoms = numpy.maximum.reduceat(ys, starts)
+    kept = bottoms[foot_ids] - ys <= _MAX_BORDER_HEIGHT
+    xs, ys, zs, foot_ids = xs[kept], ys[kept], zs[kept], foot_ids[kept]
+    # the bottom point of a foot is always kept, so no foot disappears
+    starts = numpy.searchsorted(foot_ids, numpy.arange(starts.size))
+
+    # Bounds, top view in cm
+    x_cm = x_to_cm(xs, zs)
+    left = numpy.minimum.reduceat(x_cm, starts)
+    right = numpy.maximum.reduceat(x_cm, starts)
+    close = numpy.minimum.reduceat(zs, starts)
+    far = numpy.maximum.reduceat(zs, starts)
+    heights = numpy.minimum.reduceat(y_to_cm(ys, zs), starts)
+
+    if provide_raw:
+        raw_data = numpy.split(numpy.column_stack((xs, ys, zs)), starts[1:])
+    else:
+        raw_data = [None] * starts.size
+
+    return [Obstacle(x=l, y=c, width=r - l, height=f - c, z=h, raw_data=raw)
+            for l, r, c, f, h, raw
+            in zip(left, right, close, far, heights, raw_data)]
+
+
+def extract_obstacles(depth, band=_DEFAULT_ANALYSIS_BAND, surface=_DEFAULT_SURFACE, provide_raw=False,
+                      depth_range=_RAW_DEPTH_RANGE):
     '''Returns obstacles from pixel depth
-    extract_obstacles(depth, band=..., surface=..., provide_raw=False):
+    extract_obstacles(depth, band=..., surface=..., provide_raw=False, depth_range=...):
         depth: depth array
         band: an optional analysis band in pixels (x, y, w, h) and
         surface: an optional analysis band in cm within the game area (x, z, w, p) - in top view, z is depth
         provide_raw : whether to provide raw data in the returned object or None
+        depth_range: the (min, max) raw depths in range, see raw_depth_range.
+                     No obstacle is found when it is empty (min > max)
 
         returns a list of Obstacles objects
 
@@ -140,85 +511,24 @@ def extract_obstacles(depth, band=_DEFAULT_ANALYSIS_BAND, surface=_DEFAULT_SURFA
                  (0,0) : center in front of kinect
              z: minimal height of the rectangle from the ground, 0 => on the ground
 
-             raw_data: the raw data for analysis
+             raw_data: the raw data for analysis, an array of (x, y, z) rows
     '''
-    MAX_DEPTH = 300.0  # 3 meters. FIXME Depends on Gaming Zone size.
-    MAX_BORDER_HEIGHT = 10  # pixels. a foot can never be higher than this. Restrict accordingly
-    MAX_Z_CHANGE = 10 # cm. consider discutinued foot if Z varies this much or more
-
-    dist = z_to_cm(depth)
-
-    # -- Extract borders (lower Y where Z is in range)
     bx, by, bw, bh = band
+    zone = depth[by:by + bh, bx:bx + bw] #extract zone from which data is considered
 
-    borders = []     # list of (x, ymax, z@ymax) of non-empty columns. ymax : max Y where z is not null
+    # -- Extract borders (lower Y where Z is in range)
+    # The range is tested on raw depths: only the borders are converted to cm.
     # x,y in pixels ; z in cm
+    min_depth, max_depth = depth_range
+    columns, ymax = _lowest_rows((zone >= min_depth) & (zone <= max_depth))
+    xs, ys, zs = bx + columns, by + ymax, z_to_cm(zone[ymax, columns])
 
-    zone = dist[by:by + bh, bx:bx + bw] #extract zone from which data is considered
-
-    # ymax: for each x: maximum Y for the given X on the zone where Z is in range
-    for x in xrange(zone.shape[1]):
-        non_null_y = numpy.argwhere(zone[:, x] <= MAX_DEPTH)  # y in range ?
-        if non_null_y.size:  # is there any z in the range ?
-            ymax = numpy.max(non_null_y)
-            # split to new if discontinuity (y ou z) ?
-            borders.append((bx + x, by + ymax, zone[ymax, x]))
-        # else: new foot
-
-    # -- Analysis :
-
-    # Analyze from the borders array the list of feets
-
-    feet = [] # foot : (x,y,z) points in the foot, one per X
-    x, _, z = borders[0] # initialization
-    prev_x = x
-    prev_z = z
-    foot = [] # current foot
-    for x, y, z in borders:
-        # Separate disconnected feet.
-        # connected foot : contiguous X and not too abrupt z change
-        if x - prev_x <= 1 and abs(prev_z - z) < MAX_Z_CHANGE:
-            foot.append((x, y, z))
-        else:
-            feet.append(foot)
-            foot = [(x, y, z)]
-        prev_x = x
-        prev_z = z
-    if foot:
-        feet.append(foot)
-
-    # Limit zone height : distance between base and top must be restricted. shrink foot accordingly (...)
-    # put back results to feet
-    result = []
-    for foot in feet:
-        m = y_to_cm(max(y for _, y, _ in foot)) # top du pied actuel
-        result.append([(x, y, z) for x, y, z in foot
-            if m - y_to_cm(y) <= MAX_BORDER_HEIGHT])
-    feet = result
-
-    final = []
-    for foot in feet :
-        left = x_to_cm(min(x for x,y,z in b))
-        right = x_to_cm(max(x for x,y,z in b))
-
-        close = y_to_com(min(z for x,y,z in b))
-        far = y_to_cm(max(z for x,y,z in b))
-
-        bottom = min(y for x,y,z in b)
-
-        final.append(
-            x=left,
-            y=close,
-            width=right-left,
-            height=far-close,
-            z=min(p[1] for p in b),
-            raw_data=foot if provide_raw else None
-        )
-    return final
+    # -- Analysis : split the borders into feet
+    return segment_borders(xs, ys, zs, provide_raw)
 
 def get_obstacles(provide_raw=False):
     "get buffers from the Kinect and extract obstacles. See extract_obstacles for obstacle definition"
-    k=get_buffers()
+    k=get_buffers(depth_only=True)
     if not k.real_kinect : print "Using Fake Data ..."
     return extract_obstacles(k.depth,provide_raw=provide_raw)
 
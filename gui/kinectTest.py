@@ -0,0 +1,290 @@
+import unittest
+import time
+import numpy
+import kinect
+
+
+RECORDINGS = ['2012-03-02_14-36-48',
+              '2012-03-23_12-55-38',
+              '2012-03-23_13-21-48',
+              '2012-03-30_14-14-43']
+
+
+class ZToCmTest (unittest.TestCase):
+
+    def test_into_buffer(self):
+        depth = numpy.load(RECORDINGS[0] + '_depth.npy')[100:140, 200:260]
+        out = numpy.empty(depth.shape, dtype=numpy.float32)
+
+        result = kinect.z_to_cm(depth, out=out)
+
+        self.assertTrue(result is out)
+        self.assertTrue(numpy.allclose(out, kinect.z_to_cm(depth)))
+
+    def test_into_buffer_out_of_range(self):
+        depth = numpy.array([[0, 700], [2047, 4000]], dtype=numpy.uint16)
+        out = numpy.empty(depth.shape)
+
+        result = kinect.z_to_cm(depth, out=out)
+
+        self.assertTrue(result is out)
+        self.assertEqual(out[1, 1], kinect._UNDEF_DISTANCE)
+
+    def test_float32(self):
+        depth = numpy.array([[0, 700], [900, 2047]], dtype=numpy.uint16)
+        self.assertEqual(kinect.z_to_cm(depth, dtype=numpy.float32).dtype,
+                         numpy.float32)
+
+
+class RawDepthRangeTest (unittest.TestCase):
+
+    def test_same_as_distance_test(self):
+        raw = numpy.arange(2048)
+        for max_depth in [100.0, 250.0, kinect._MAX_DEPTH, 1000.0]:
+            low, high = kinect.raw_depth_range(max_depth)
+            self.assertTrue((((raw >= low) & (raw <= high))
+                             == (kinect.z_to_cm(raw) <= max_depth)).all())
+
+    def test_nothing_in_range(self):
+        low, high = kinect.raw_depth_range(kinect._MIN_DISTANCE - 10)
+        self.assertTrue(low > high)
+        depth = numpy.load(RECORDINGS[1] + '_depth.npy')
+        self.assertEqual(kinect.extract_obstacles(depth, depth_range=(low, high)), [])
+
+
+class ExtractBordersTest (unittest.TestCase):
+
+    def test_lowest_row_in_range(self):
+        dist = numpy.ones((6, 4)) * kinect._UNDEF_DISTANCE
+        dist[1, 0] = 150.0
+        dist[4, 0] = 120.0
+        dist[2, 2] = 280.0
+        dist[5, 3] = 310.0    # too far
+
+        xs, ys, zs = kinect.extract_borders(dist, (0, 0, 4, 6))
+
+        self.assertEqual(list(xs), [0, 2])
+        self.assertEqual(list(ys), [4, 2])
+        self.assertEqual(list(zs), [120.0, 280.0])
+
+    def test_band_offset(self):
+        dist = numpy.ones((10, 10)) * kinect._UNDEF_DISTANCE
+        dist[7, 6] = 100.0
+        dist[8, 6] = 100.0   # below the band
+
+        xs, ys, zs = kinect.extract_borders(dist, (5, 3, 4, 5))
+
+        self.assertEqual(list(xs), [6])
+        self.assertEqual(list(ys), [7])
+
+    def test_empty_band(self):
+        dist = numpy.ones((6, 4)) * kinect._UNDEF_DISTANCE
+        xs, ys, zs = kinect.extract_borders(dist, (0, 0, 4, 6))
+        self.assertEqual(xs.size, 0)
+        self.assertEqual(ys.size, 0)
+        self.assertEqual(zs.size, 0)
+
+    def test_same_as_column_loop(self):
+        bx, by, bw, bh = kinect._DEFAULT_ANALYSIS_BAND
+        for name in RECORDINGS:
+            dist = kinect.z_to_cm(numpy.load(name + '_depth.npy'))
+            zone = dist[by:by + bh, bx:bx + bw]
+            expected = []
+            for x in xrange(zone.shape[1]):
+                non_null_y = numpy.argwhere(zone[:, x] <= kinect._MAX_DEPTH)
+                if non_null_y.size:
+                    ymax = numpy.max(non_null_y)
+                    expected.append((bx + x, by + ymax, zone[ymax, x]))
+
+            borders = zip(*kinect.extract_borders(dist))
+            self.assertEqual(borders, expected)
+
+
+class SegmentBordersTest (unittest.TestCase):
+
+    def test_split_on_x_gap_and_z_change(self):
+        xs = numpy.array([10, 11, 12, 14, 15, 16, 17])
+        ys = numpy.array([50, 50, 51, 50, 50, 50, 50])
+        zs = numpy.array([100.0, 101.0, 102.0, 150.0, 151.0, 180.0, 181.0])
+
+        obstacles = kinect.segment_borders(xs, ys, zs, provide_raw=True)
+
+        self.assertEqual([list(o.raw_data[:, 0]) for o in obstacles],
+                         [[10, 11, 12], [14, 15], [16, 17]])
+        self.assertEqual(obstacles[0].y, 100.0)
+        self.assertEqual(obstacles[0].height, 2.0)
+
+    def test_drop_points_above_foot_bottom(self):
+        xs = numpy.arange(5)
+        ys = numpy.array([40, 55, 60, 58, 45])
+        zs = numpy.array([100.0, 100.0, 100.0, 100.0, 200.0])
+
+        obstacles = kinect.segment_borders(xs, ys, zs, provide_raw=True)
+
+        self.assertEqual(len(obstacles), 2)
+        self.assertEqual(list(obstacles[0].raw_data[:, 0]), [1, 2, 3])
+        self.assertEqual(list(obstacles[1].raw_data[:, 0]), [4])
+
+    def test_bounds(self):
+        xs = numpy.array([300, 301, 302])
+        ys = numpy.array([250, 251, 252])
+        zs = numpy.array([120.0, 121.0, 122.0])
+
+        obstacle, = kinect.segment_borders(xs, ys, zs)
+
+        x_cm = kinect.x_to_cm(xs, zs)
+        self.assertAlmostEqual(obstacle.x, x_cm.min())
+        self.assertAlmostEqual(obstacle.width, x_cm.max() - x_cm.min())
+        self.assertAlmostEqual(obstacle.z, kinect.y_to_cm(ys, zs).min())
+        self.assertEqual(obstacle.raw_data, None)
+
+    def test_no_border(self):
+        empty = numpy.array([])
+        self.assertEqual(kinect.segment_borders(empty, empty, empty), [])
+
+    def test_extract_obstacles_on_raw_depth(self):
+        for name in RECORDINGS:
+            depth = numpy.load(name + '_depth.npy')
+            self.assertEqual(
+                    kinect.extract_obstacles(depth),
+                    kinect.segment_borders(*kinect.extract_borders(kinect.z_to_cm(depth))))
+
+    def test_extract_obstacles_from_recordings(self):
+        for name in RECORDINGS:
+            obstacles = kinect.extract_obstacles(numpy.load(name + '_depth.npy'))
+            for obstacle in obstacles:
+                self.assertTrue(obstacle.width >= 0)
+                self.assertTrue(0 <= obstacle.height < kinect._MAX_DEPTH)
+
+
+class DefaultDataTest (unittest.TestCase):
+
+    def tearDown(self):
+        kinect.set_default_data(RECORDINGS[0])
+
+    def test_set_default_data(self):
+        kinect.set_default_data(RECORDINGS[2])
+        expected = numpy.load(RECORDINGS[2] + '_depth.npy')
+        self.assertTrue((kinect.get_buffers().depth == expected).all())
+
+
+class FrameGrabberTest (unittest.TestCase):
+
+    def test_latest_frame(self):
+        grabber = kinect.FrameGrabber(kinect.file_source(RECORDINGS[1], fps=200))
+        grabber.start()
+        try:
+            first = grabber.latest(timeout=5)
+            time.sleep(0.05)
+            second = grabber.latest()
+        finally:
+            grabber.stop()
+
+        self.assertTrue(first.seq >= 1)
+        self.assertTrue(second.seq > first.seq)
+        self.assertTrue(second.timestamp > first.timestamp)
+        self.assertFalse(second.data.real_kinect)
+        expected = numpy.load(RECORDINGS[1] + '_depth.npy')
+        self.assertTrue((second.data.depth == expected).all())
+
+    def test_ring_buffers_are_reused(self):
+        grabber = kinect.FrameGrabber(kinect.file_source(RECORDINGS[0], fps=500),
+                                      ring_size=2)
+        grabber.start()
+        try:
+            buffers = set()
+            seen = set()
+            while len(seen) < 6:
+                frame = grabber.latest(timeout=5)
+                if frame.seq not in seen:
+                    seen.add(frame.seq)
+                    buffers.add(id(frame.data.depth))
+                time.sleep(0.001)
+        finally:
+            grabber.stop()
+        self.assertEqual(len(buffers), 2)
+
+    def test_get_buffers_uses_acquisition(self):
+        kinect.start_acquisition(kinect.file_source(RECORDINGS[2], fps=100))
+        try:
+            frame = kinect.get_frame()
+            data = kinect.get_buffers()
+            obstacles = kinect.get_obstacles()
+        finally:
+            kinect.stop_acquisition()
+
+        self.assertTrue(frame.seq >= 1)
+        expected = numpy.load(RECORDINGS[2] + '_depth.npy')
+        self.assertTrue((data.depth == expected).all())
+        self.assertEqual(len(obstacles),
+                         len(kinect.extract_obstacles(expected)))
+        self.assertEqual(kinect.get_frame().seq, 0)
+
+    def test_empty_source_does_not_block(self):
+        kinect.start_acquisition(lambda: None)
+        try:
+            start = time.time()
+            frame = kinect.get_frame()
+            data = kinect.get_buffers(depth_only=True)
+        finally:
+            kinect.stop_acquisition()
+        self.assertTrue(time.time() - start < 1)
+        self.assertEqual(frame.seq, 0)
+        self.assertFalse(data.real_kinect)
+
+    def test_failing_source_does_not_block(self):
+        def read():
+            raise IOError('no more frame')
+
+        grabber = kinect.FrameGrabber(read)
+        grabber.start()
+        self.assertEqual(grabber.latest(timeout=5), None)
+        self.assertFalse(grabber.is_running())
+        grabber.stop()
+
+    def test_default_data_at_kinect_rate(self):
+        if kinect.freenect:
+            return
+        grabber = kinect.FrameGrabber(depth_only=True)
+        grabber.start()
+        try:
+            time.sleep(0.3)
+            frame = grabber.latest(timeout=5)
+        finally:
+            grabber.stop()
+        self.assertTrue(1 <= frame.seq <= 15, frame.seq)
+
+
+class DepthOnlyTest (unittest.TestCase):
+
+    def test_rgb_fetched_once_on_demand(self):
+        calls = []
+
+        def fetch_rgb():
+            calls.append(1)
+            return numpy.zeros((480, 640, 3), dtype=numpy.uint8)
+
+        data = kinect.LazyKinectData(real_kinect=True, depth=None,
+                                     fetch_rgb=fetch_rgb)
+        self.assertEqual(calls, [])
+        self.assertEqual(data.rgb.shape, (480, 640, 3))
+        data.rgb
+        self.assertEqual(calls, [1])
+
+    def test_depth_only_grabber(self):
+        grabber = kinect.FrameGrabber(kinect.file_source(RECORDINGS[3], fps=200),
+                                      depth_only=True)
+        grabber.start()
+        try:
+            frame = grabber.latest(timeout=5)
+        finally:
+            grabber.stop()
+
+        self.assertTrue(isinstance(frame.data, kinect.LazyKinectData))
+        expected = numpy.load(RECORDINGS[3] + '_depth.npy')
+        self.assertTrue((frame.data.depth == expected).all())
+        self.assertEqual(frame.data.rgb.shape, (480, 640, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
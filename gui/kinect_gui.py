@@ -1,5 +1,7 @@
 from kinect import Kinect, DepthAnalyser
-import numpy
+from kinect import start_acquisition, stop_acquisition
+from recording import Recorder, EXTENSION
+from argb import rgb_to_argb32, depth_to_argb32
 
 import pygtk
 pygtk.require('2.0')
@@ -94,27 +96,10 @@ class KinectDisplay(gtk.DrawingArea):
         self._feet = f
 
         # Convert numpy arrays to cairo surfaces.
-        alpha_channel = numpy.ones((480, 640, 1), dtype=numpy.uint8) * 255
-
-        # 1. RGB bitmap.
-        rgb32 = numpy.concatenate((alpha_channel, rgb), axis=2)
         self._rgb_surface = cairo.ImageSurface.create_for_data(
-                rgb32[:, :, ::-1].astype(numpy.uint8),
-                cairo.FORMAT_ARGB32, 640, 480)
-
-        # 2. Depth map, take care of special NaN value.
-        i = numpy.amin(depth)
-        depth_clean = numpy.where(depth == Kinect.UNDEF_DEPTH, 0, depth)
-        a = numpy.amax(depth_clean)
-        depth = numpy.where(
-                depth == Kinect.UNDEF_DEPTH,
-                0,
-                255 - (depth - i) * 254.0 / (a - i))
-        depth32 = numpy.dstack((
-            alpha_channel, depth, numpy.where(depth == 0, 128, depth), depth))
+                rgb_to_argb32(rgb), cairo.FORMAT_ARGB32, 640, 480)
         self._depth_surface = cairo.ImageSurface.create_for_data(
-                depth32[:, :, ::-1].astype(numpy.uint8),
-                cairo.FORMAT_ARGB32, 640, 480)
+                depth_to_argb32(depth), cairo.FORMAT_ARGB32, 640, 480)
 
         self._notify_observers()
 
@@ -428,6 +413,7 @@ class KinectTestWindow(gtk.Window):
     def __init__(self):
         self._paused = True
         self._kinect = Kinect()
+        self._recorder = None
 
         gtk.Window.__init__(self)
         self.set_default_size(1280, 960)
@@ -455,8 +441,8 @@ class KinectTestWindow(gtk.Window):
         button_vbox.pack_start(self.choose)
         self.choose.connect("clicked", self._choose_cb)
 
-        # Save button.
-        self.save = gtk.Button('Save', gtk.STOCK_SAVE)
+        # Save button, starts and stops recording.
+        self.save = gtk.Button('Save', gtk.STOCK_MEDIA_RECORD)
         self.save.set_sensitive(False)
         button_vbox.pack_start(self.save)
         self.save.connect("clicked", self._save_cb)
@@ -466,7 +452,7 @@ class KinectTestWindow(gtk.Window):
         button_vbox.pack_start(self.pause)
         self.pause.connect("clicked", self._pause_cb)
 
-        self.connect("destroy", gtk.main_quit)
+        self.connect("destroy", self._destroy_cb)
         self.show_all()
 
         # Auto-refresh at 10 frames per seconds.
@@ -505,16 +491,33 @@ class KinectTestWindow(gtk.Window):
             self.queue_draw()
 
     def _save_cb(self, widget, data=None):
-        rgb = self._kinect.latest_rgb
-        depth = self._kinect.latest_depth
-        fname_base = time.strftime('%Y-%m-%d_%H-%M-%S', time.localtime())
-        numpy.save(fname_base + '_rgb', rgb)
-        numpy.save(fname_base + '_depth', depth)
-        print 'Saved with "%s" base filename' % fname_base
+        if self._recorder:
+            self._stop_recording()
+            return
+
+        fname = time.strftime('%Y-%m-%d_%H-%M-%S', time.localtime()) + EXTENSION
+        self._recorder = Recorder(fname, with_rgb=True)
+        # Frames are recorded from the grabber thread: a busy GUI drops none.
+        start_acquisition(on_frame=self._recorder.add_frame)
+        self.save.set_label(gtk.STOCK_MEDIA_STOP)
+        print 'Recording to "%s"' % fname
+
+    def _stop_recording(self):
+        stop_acquisition()
+        self._recorder.close()
+        print 'Saved %d frames to "%s", %d dropped' % (self._recorder.frame_count,
+                self._recorder.filename, self._recorder.dropped_frames)
+        self._recorder = None
+        self.save.set_label(gtk.STOCK_MEDIA_RECORD)
+
+    def _destroy_cb(self, widget, data=None):
+        if self._recorder:
+            self._stop_recording()
+        gtk.main_quit()
 
     def _pause_cb(self, widget, data=None):
         self._paused = not self._paused
-        self.save.set_sensitive(self._paused)
+        self.save.set_sensitive(self._paused or self._recorder is not None)
         self.choose.set_sensitive(self._paused)
 
         if not self._paused:
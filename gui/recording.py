@@ -0,0 +1,279 @@
+"""
+recording.py
+
+Continuous recording of kinect frames.
+
+A recording is a single file of compressed chunks:
+ - header: magic, version, frame height and width, whether rgb is recorded
+ - chunks of consecutive frames. Each one starts with a chunk magic, its
+   frame count and compressed size, then the timestamp of its frames. The
+   frames follow, compressed with zlib. In a chunk, the first depth frame is
+   stored as is and the next ones as the difference with the previous frame,
+   which is mostly zeros for 11-bit kinect depth. rgb frames, if any, follow
+   the depth frames.
+ - index: offset, size and frame count of every chunk, then the timestamp of
+   every frame
+ - trailer: offset of the index and an end magic
+
+The index is written when the recorder is closed. Without it, if the
+recording was interrupted, the chunks are found by reading their headers
+one after the other: only the frames not written yet are lost.
+
+Frames are encoded and written by a background thread so the caller never
+waits for the disk. When it falls behind, new frames are dropped rather than
+queued without limit.
+"""
+
+import Queue
+import struct
+import threading
+import time
+import zlib
+
+import numpy
+
+from kinect import LazyKinectData
+
+__all__ = ['Recorder', 'Recording', 'EXTENSION']
+
+EXTENSION = '.krec'
+_MAGIC = 'KREC'
+_END_MAGIC = 'KIDX'
+_CHUNK_MAGIC = 'KCHK'
+_VERSION = 2
+_HEADER = struct.Struct('<4sBHHB')   # magic, version, height, width, has rgb
+_CHUNK_HEADER = struct.Struct('<4sII')  # chunk magic, frame count, compressed size
+_TRAILER = struct.Struct('<Q4s')     # index offset, end magic
+_CHUNK_COUNT = struct.Struct('<I')
+
+_DEPTH_DTYPE = numpy.dtype('<u2')
+_DELTA_DTYPE = numpy.dtype('<i2')
+_RGB_DTYPE = numpy.dtype('u1')
+
+
+class Recorder(object):
+    '''Appends frames to a recording file, from a background thread.'''
+
+    def __init__(self, filename, with_rgb=False, chunk_frames=30, compression=1,
+                 max_queue=30):
+        '''filename: the recording file, overwritten
+           with_rgb: whether to record the rgb frames too
+           chunk_frames: number of frames per compressed chunk
+           compression: zlib compression level, 1 (fast) to 9 (small)
+           max_queue: number of frames waiting for the writer, at most.
+                      Frames added when it is full are dropped and counted in
+                      dropped_frames'''
+        self.filename = filename
+        self.with_rgb = with_rgb
+        self._chunk_frames = chunk_frames
+        self._compression = compression
+        self._queue = Queue.Queue(max_queue)
+        self._file = open(filename, 'wb')
+        self._shape = None
+        self._chunks = []       # (offset, size, frame count)
+        self._timestamps = []
+        self.frame_count = 0
+        self.dropped_frames = 0
+        self._thread = threading.Thread(target=self._run, name='Recorder')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def add(self, depth, rgb=None, timestamp=None):
+        '''queues a frame for writing. The arrays are copied, so the caller
+           may reuse them at once.
+           timestamp: defaults to now, as returned by time.time()
+           returns False if the frame is dropped, the queue being full'''
+        if self._shape is None:
+            self._shape = depth.shape
+        elif depth.shape != self._shape:
+            raise ValueError('frame shape %s differs from %s'
+                             % (depth.shape, self._shape))
+        if timestamp is None:
+            timestamp = time.time()
+        if self.with_rgb:
+            rgb = numpy.array(rgb, dtype=_RGB_DTYPE)
+        else:
+            rgb = None
+        try:
+            self._queue.put_nowait((numpy.array(depth, dtype=_DEPTH_DTYPE), rgb,
+                                    timestamp))
+        except Queue.Full:
+            self.dropped_frames += 1
+            return False
+        self.frame_count += 1
+        return True
+
+    def add_frame(self, frame):
+        '''queues a kinect Frame, see add. Fit for the FrameGrabber on_frame
+           hook, so every grabbed frame is recorded from the grabber thread'''
+        rgb = frame.data.rgb if self.with_rgb else None
+        return self.add(frame.data.depth, rgb, frame.timestamp)
+
+    def close(self):
+        ''' writes the pending frames and the index, then closes the file '''
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        depths, rgbs = [], []
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            depth, rgb, timestamp = item
+            if not self._chunks and not depths:
+                self._write_header(depth.shape)
+            depths.append(depth)
+            rgbs.append(rgb)
+            self._timestamps.append(timestamp)
+            if len(depths) == self._chunk_frames:
+                self._write_chunk(depths, rgbs)
+                depths, rgbs = [], []
+
+        if depths:
+            self._write_chunk(depths, rgbs)
+        self._write_index()
+        self._file.close()
+
+    def _write_header(self, shape):
+        height, width = shape
+        self._file.write(_HEADER.pack(_MAGIC, _VERSION, height, width,
+                                      1 if self.with_rgb else 0))
+
+    def _write_chunk(self, depths, rgbs):
+        depth = numpy.array(depths)
+        # Delta encoding: values are within [0, 2047], so are their differences.
+        deltas = numpy.empty(depth.shape, dtype=_DELTA_DTYPE)
+        deltas[0] = depth[0]
+        numpy.subtract(depth[1:], depth[:-1], out=deltas[1:], casting='unsafe')
+        data = deltas.tostring()
+        if self.with_rgb:
+            data += numpy.array(rgbs).tostring()
+
+        compressed = zlib.compress(data, self._compression)
+        count = len(depths)
+        self._file.write(_CHUNK_HEADER.pack(_CHUNK_MAGIC, count, len(compressed)))
+        timestamps = self._timestamps[-count:]
+        self._file.write(numpy.array(timestamps, dtype='<f8').tostring())
+        self._chunks.append((self._file.tell(), len(compressed), count))
+        self._file.write(compressed)
+        # Readable up to this chunk if the recording is interrupted.
+        self._file.flush()
+
+    def _write_index(self):
+        if not self._chunks and not self._timestamps:
+            self._write_header((0, 0))
+        index_offset = self._file.tell()
+        self._file.write(_CHUNK_COUNT.pack(len(self._chunks)))
+        self._file.write(numpy.array(self._chunks, dtype='<i8').tostring())
+        self._file.write(numpy.array(self._timestamps, dtype='<f8').tostring())
+        self._file.write(_TRAILER.pack(index_offset, _END_MAGIC))
+
+
+class Recording(object):
+    '''A recording file, indexed as a list of LazyKinectData.
+    Frames are decoded a chunk at a time; the last decoded chunk is kept.
+    An interrupted recording, without index, is read up to its last complete
+    chunk: complete is then False.'''
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                # Interrupted before its first frame was written: empty
+                if not _MAGIC.startswith(header[:len(_MAGIC)]):
+                    raise IOError('%s is not a kinect recording' % filename)
+                self.shape = (0, 0)
+                self.with_rgb = False
+                self.complete = False
+                self._chunks = numpy.empty((0, 3), dtype='<i8')
+                self.timestamps = numpy.empty(0, dtype='<f8')
+            else:
+                magic, version, height, width, has_rgb = _HEADER.unpack(header)
+                if magic != _MAGIC or version != _VERSION:
+                    raise IOError('%s is not a kinect recording' % filename)
+                self.shape = (height, width)
+                self.with_rgb = bool(has_rgb)
+                self._read_index(f)
+
+        # first frame of every chunk
+        self._firsts = numpy.concatenate(([0], numpy.cumsum(self._chunks[:, 2])))
+        self._cached = (None, None, None)
+
+    def _read_index(self, f):
+        "reads the index, or rebuilds it if the recording was interrupted"
+        f.seek(0, 2)
+        file_size = f.tell()
+        index_offset, end_magic = 0, None
+        if file_size >= _HEADER.size + _TRAILER.size:
+            f.seek(-_TRAILER.size, 2)
+            index_offset, end_magic = _TRAILER.unpack(f.read(_TRAILER.size))
+        self.complete = (end_magic == _END_MAGIC
+                         and _HEADER.size <= index_offset < file_size)
+        if self.complete:
+            f.seek(index_offset)
+            count, = _CHUNK_COUNT.unpack(f.read(_CHUNK_COUNT.size))
+            self._chunks = numpy.fromstring(
+                    f.read(count * 3 * 8), dtype='<i8').reshape((count, 3))
+            frames = int(self._chunks[:, 2].sum())
+            self.timestamps = numpy.fromstring(f.read(frames * 8), dtype='<f8')
+        else:
+            self._chunks, self.timestamps = self._scan(f, file_size)
+
+    @staticmethod
+    def _scan(f, file_size):
+        "rebuilds the index from the chunk headers, up to the last complete chunk"
+        chunks = []
+        timestamps = []
+        offset = _HEADER.size
+        while offset + _CHUNK_HEADER.size <= file_size:
+            f.seek(offset)
+            magic, count, size = _CHUNK_HEADER.unpack(f.read(_CHUNK_HEADER.size))
+            data_offset = offset + _CHUNK_HEADER.size + count * 8
+            if magic != _CHUNK_MAGIC or data_offset + size > file_size:
+                break
+            timestamps.append(numpy.fromstring(f.read(count * 8), dtype='<f8'))
+            chunks.append((data_offset, size, count))
+            offset = data_offset + size
+        chunks = numpy.array(chunks, dtype='<i8').reshape((len(chunks), 3))
+        if not timestamps:
+            return chunks, numpy.empty(0, dtype='<f8')
+        return chunks, numpy.concatenate(timestamps)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('frame %d out of recording' % index)
+        chunk = numpy.searchsorted(self._firsts, index, side='right') - 1
+        depths, rgbs = self._decode(chunk)
+        i = index - self._firsts[chunk]
+        rgb = rgbs[i] if rgbs is not None else None
+        return LazyKinectData(real_kinect=False, depth=depths[i],
+                              fetch_rgb=lambda: rgb)
+
+    def _decode(self, chunk):
+        if self._cached[0] == chunk:
+            return self._cached[1:]
+
+        offset, size, count = self._chunks[chunk]
+        with open(self.filename, 'rb') as f:
+            f.seek(offset)
+            data = zlib.decompress(f.read(size))
+
+        height, width = self.shape
+        depth_size = count * height * width * _DELTA_DTYPE.itemsize
+        deltas = numpy.fromstring(data[:depth_size], dtype=_DELTA_DTYPE)
+        depths = numpy.cumsum(deltas.reshape((count, height, width)), axis=0,
+                              dtype=_DELTA_DTYPE).astype(_DEPTH_DTYPE)
+        rgbs = None
+        if self.with_rgb:
+            rgbs = numpy.fromstring(data[depth_size:], dtype=_RGB_DTYPE)
+            rgbs = rgbs.reshape((count, height, width, 3))
+
+        self._cached = (chunk, depths, rgbs)
+        return depths, rgbs
@@ -0,0 +1,152 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import numpy
+import kinect
+from recording import Recorder, Recording, EXTENSION
+from replay import Session
+
+
+class RecordingTest (unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'session' + EXTENSION)
+        depth = numpy.load(os.path.join(kinect._DATA_DIR,
+                                        '2012-03-02_14-36-48_depth.npy'))
+        self.depths = [depth]
+        random = numpy.random.RandomState(0)
+        for _ in range(6):
+            noise = random.randint(-2, 3, depth.shape)
+            depth = numpy.clip(depth + noise, 0, 2047).astype(numpy.uint16)
+            self.depths.append(depth)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_depth_round_trip(self):
+        recorder = Recorder(self.filename, chunk_frames=3)
+        for i, depth in enumerate(self.depths):
+            recorder.add(depth, timestamp=100.0 + i)
+        recorder.close()
+
+        recording = Recording(self.filename)
+        self.assertTrue(recording.complete)
+        self.assertEqual(len(recording), 7)
+        self.assertEqual(list(recording.timestamps), [100.0 + i for i in range(7)])
+        for i in [0, 4, 2, 6, 3]:
+            self.assertTrue((recording[i].depth == self.depths[i]).all())
+        self.assertEqual(recording[0].rgb, None)
+        self.assertTrue((recording[-1].depth == self.depths[-1]).all())
+        self.assertRaises(IndexError, recording.__getitem__, 7)
+
+    def test_rgb_round_trip(self):
+        rgb = numpy.load(os.path.join(kinect._DATA_DIR,
+                                      '2012-03-02_14-36-48_rgb.npy'))
+        recorder = Recorder(self.filename, with_rgb=True)
+        recorder.add(self.depths[0], rgb)
+        recorder.add(self.depths[1], rgb[::-1])
+        recorder.close()
+
+        recording = Recording(self.filename)
+        self.assertTrue((recording[1].rgb == rgb[::-1]).all())
+        self.assertTrue((recording[1].depth == self.depths[1]).all())
+
+    def test_compressed(self):
+        recorder = Recorder(self.filename)
+        for depth in self.depths:
+            recorder.add(depth)
+        recorder.close()
+        raw_size = sum(depth.nbytes for depth in self.depths)
+        self.assertTrue(os.path.getsize(self.filename) < raw_size / 2)
+
+    def test_empty_recording(self):
+        Recorder(self.filename).close()
+        self.assertEqual(len(Recording(self.filename)), 0)
+
+    def test_interrupted_recording(self):
+        recorder = Recorder(self.filename, chunk_frames=3)
+        for i, depth in enumerate(self.depths):
+            recorder.add(depth, timestamp=100.0 + i)
+        recorder.close()
+        offset, size, count = Recording(self.filename)._chunks[1]
+
+        # No trailer: the index is rebuilt from the chunk headers.
+        with open(self.filename, 'r+b') as f:
+            f.truncate(os.path.getsize(self.filename) - 5)
+        recording = Recording(self.filename)
+        self.assertFalse(recording.complete)
+        self.assertEqual(len(recording), 7)
+        self.assertEqual(list(recording.timestamps), [100.0 + i for i in range(7)])
+        self.assertTrue((recording[5].depth == self.depths[5]).all())
+
+        # Second chunk cut: only the first one is left.
+        with open(self.filename, 'r+b') as f:
+            f.truncate(offset + size // 2)
+        recording = Recording(self.filename)
+        self.assertEqual(len(recording), 3)
+        self.assertTrue((recording[2].depth == self.depths[2]).all())
+
+    def test_interrupted_before_header(self):
+        recorder = Recorder(self.filename)
+        recorder.add(self.depths[0])
+        recorder.close()
+        with open(self.filename, 'rb') as f:
+            header = f.read(5)
+
+        for data in ['', header]:
+            with open(self.filename, 'wb') as f:
+                f.write(data)
+            recording = Recording(self.filename)
+            self.assertFalse(recording.complete)
+            self.assertEqual(len(recording), 0)
+
+        with open(self.filename, 'wb') as f:
+            f.write('PK')
+        self.assertRaises(IOError, Recording, self.filename)
+
+    def test_full_queue_drops_frames(self):
+        rgb = numpy.load(os.path.join(kinect._DATA_DIR,
+                                      '2012-03-02_14-36-48_rgb.npy'))
+        recorder = Recorder(self.filename, with_rgb=True, chunk_frames=1,
+                            compression=9, max_queue=1)
+        added = [recorder.add(depth, rgb) for depth in self.depths * 3]
+        recorder.close()
+
+        self.assertTrue(recorder.dropped_frames > 0)
+        self.assertEqual(added.count(False), recorder.dropped_frames)
+        self.assertEqual(recorder.frame_count + recorder.dropped_frames, 21)
+        self.assertEqual(len(Recording(self.filename)), recorder.frame_count)
+
+    def test_record_from_grabber(self):
+        frames = iter([kinect.KinectData(False, None, depth) for depth in self.depths])
+        recorder = Recorder(self.filename)
+        grabber = kinect.FrameGrabber(lambda: next(frames, None), depth_only=True,
+                                      on_frame=recorder.add_frame)
+        grabber.start()
+        deadline = time.time() + 5
+        while grabber.is_running() and time.time() < deadline:
+            time.sleep(0.01)
+        grabber.stop()
+        recorder.close()
+
+        recording = Recording(self.filename)
+        self.assertEqual(len(recording), 7)
+        self.assertTrue((recording[6].depth == self.depths[6]).all())
+
+    def test_replay_recording(self):
+        recorder = Recorder(self.filename)
+        for i, depth in enumerate(self.depths):
+            recorder.add(depth, timestamp=i / 30.0)
+        recorder.close()
+
+        session = Session(self.filename)
+        self.assertEqual(len(session), 7)
+        frames = list(session.frames())
+        self.assertTrue((frames[5].data.depth == self.depths[5]).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+"""
+replay.py
+
+Plays back recorded kinect sessions.
+
+A session is either:
+ - a directory of saved frames (<name>_depth.npy and <name>_rgb.npy pairs, as
+   written by the Save button), played in name order. Names are timestamps
+   like 2012-03-02_14-36-48.
+ - a single <name>_depth.npy file holding a (n, 480, 640) stack of frames, with
+   an optional (n, 480, 640, 3) <name>_rgb.npy and an optional (n,)
+   <name>_timestamps.npy, in seconds.
+ - a continuous recording (see recording.py).
+
+Arrays are memory-mapped: opening a session reads nothing, and frames are
+only paged in when used. Recordings are decoded a chunk at a time.
+"""
+
+import glob
+import os
+import time
+
+import numpy
+
+from kinect import Frame, LazyKinectData
+from recording import Recording, EXTENSION
+
+__all__ = ['Session', 'replay_source']
+
+_DEPTH_SUFFIX = '_depth.npy'
+_RGB_SUFFIX = '_rgb.npy'
+_TIMESTAMPS_SUFFIX = '_timestamps.npy'
+
+_NAME_FORMAT = '%Y-%m-%d_%H-%M-%S'
+
+
+class Session(object):
+    '''A recorded session, indexed as a list of LazyKinectData'''
+
+    def __init__(self, path, fps=30.0):
+        '''path: a directory of saved frames, a session file, with or
+           without its _depth.npy suffix, or a recording
+           fps: frame rate used when the recording has no timestamps'''
+        self._depths = []
+        self._rgbs = []
+        self._recording = None
+
+        if path.endswith(EXTENSION):
+            self._recording = Recording(path)
+            timestamps = self._recording.timestamps
+        elif os.path.isdir(path):
+            self._open_directory(path)
+            timestamps = self._timestamps_from_names()
+        else:
+            if path.endswith(_DEPTH_SUFFIX):
+                path = path[:-len(_DEPTH_SUFFIX)]
+            self._open_file(path)
+            timestamps = None
+            if os.path.exists(path + _TIMESTAMPS_SUFFIX):
+                timestamps = numpy.load(path + _TIMESTAMPS_SUFFIX)
+
+        if timestamps is None:
+            timestamps = numpy.arange(len(self._depths)) / fps
+        self.timestamps = numpy.asarray(timestamps, dtype=float)
+
+    def _open_directory(self, path):
+        self._names = []
+        for depth_file in sorted(glob.glob(os.path.join(path, '*' + _DEPTH_SUFFIX))):
+            base = depth_file[:-len(_DEPTH_SUFFIX)]
+            self._names.append(os.path.basename(base))
+            self._depths.append(numpy.load(depth_file, mmap_mode='r'))
+            self._rgbs.append(_load_optional(base + _RGB_SUFFIX))
+
+    def _open_file(self, path):
+        self._names = None
+        depth = numpy.load(path + _DEPTH_SUFFIX, mmap_mode='r')
+        rgb = _load_optional(path + _RGB_SUFFIX)
+        if depth.ndim == 2:  # a single saved frame
+            self._depths = [depth]
+            self._rgbs = [rgb]
+        else:
+            self._depths = depth
+            self._rgbs = rgb if rgb is not None else [None] * len(depth)
+
+    def _timestamps_from_names(self):
+        try:
+            return [time.mktime(time.strptime(name, _NAME_FORMAT))
+                    for name in self._names]
+        except ValueError:
+            return None
+
+    def __len__(self):
+        if self._recording:
+            return len(self._recording)
+        return len(self._depths)
+
+    def __getitem__(self, index):
+        if self._recording:
+            return self._recording[index]
+        rgb = self._rgbs[index]
+        return LazyKinectData(real_kinect=False,
+                              depth=self._depths[index],
+                              fetch_rgb=lambda: rgb)
+
+    def frames(self, realtime=False, max_gap=1.0):
+        '''iterates over the session Frames
+           realtime: whether to wait between frames as long as when recording
+           max_gap: longest wait between two frames in realtime, in seconds
+
+           frames are numbered from 1 and timestamped with the recording time'''
+        start = None
+        for index in xrange(len(self)):
+            timestamp = self.timestamps[index]
+            if realtime:
+                if start is None:
+                    start = time.time()
+                    elapsed = 0.0
+                else:
+                    elapsed += min(timestamp - self.timestamps[index - 1], max_gap)
+                    delay = start + elapsed - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+            yield Frame(seq=index + 1, timestamp=timestamp, data=self[index])
+
+
+def replay_source(session, realtime=True, loop=False):
+    '''Returns a kinect source, for kinect.FrameGrabber, that plays a session
+    replay_source(session, realtime=True, loop=False):
+        session: a Session or its path
+        realtime: whether to play at the recording frame rate or as fast as possible
+        loop: whether to start again at the end of the session, otherwise
+              the source is exhausted
+    '''
+    if not isinstance(session, Session):
+        session = Session(session)
+    state = {'frames': session.frames(realtime)}
+
+    def read():
+        for frame in state['frames']:
+            return frame.data
+        if not loop or not len(session):
+            return None
+        state['frames'] = session.frames(realtime)
+        return read()
+    return read
+
+
+def _load_optional(filename):
+    if os.path.exists(filename):
+        return numpy.load(filename, mmap_mode='r')
+    return None
@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import numpy
+import kinect
+from replay import Session, replay_source
+
+
+class SessionTest (unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.base = os.path.join(self.directory, 'session')
+        depth = numpy.arange(4 * 6 * 8, dtype=numpy.uint16).reshape((4, 6, 8))
+        numpy.save(self.base + '_depth', depth)
+        numpy.save(self.base + '_timestamps', numpy.array([10.0, 10.02, 10.04, 10.06]))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_directory_of_saved_frames(self):
+        session = Session(kinect._DATA_DIR)
+
+        self.assertEqual(len(session), 4)
+        self.assertTrue(isinstance(session[0].depth, numpy.memmap))
+        self.assertEqual(session[0].rgb.shape, (480, 640, 3))
+        expected = numpy.load(os.path.join(kinect._DATA_DIR,
+                                           '2012-03-23_12-55-38_depth.npy'))
+        self.assertTrue((session[1].depth == expected).all())
+        self.assertTrue((numpy.diff(session.timestamps) > 0).all())
+
+    def test_frame_stack(self):
+        session = Session(self.base + '_depth.npy')
+
+        self.assertEqual(len(session), 4)
+        self.assertEqual(session[2].depth[0, 0], 2 * 6 * 8)
+        self.assertEqual(session[2].rgb, None)
+        self.assertEqual(list(session.timestamps), [10.0, 10.02, 10.04, 10.06])
+
+    def test_frames_realtime(self):
+        session = Session(self.base)
+
+        start = time.time()
+        frames = list(session.frames(realtime=True))
+        duration = time.time() - start
+
+        self.assertEqual([frame.seq for frame in frames], [1, 2, 3, 4])
+        self.assertEqual(frames[3].timestamp, 10.06)
+        self.assertTrue(duration >= 0.05)
+
+    def test_replay_source(self):
+        read = replay_source(self.base, realtime=False)
+        depths = []
+        data = read()
+        while data is not None:
+            depths.append(data.depth[0, 0])
+            data = read()
+        self.assertEqual(depths, [0, 48, 96, 144])
+
+    def test_replay_source_loop(self):
+        read = replay_source(Session(self.base), realtime=False, loop=True)
+        depths = [read().depth[0, 0] for _ in range(6)]
+        self.assertEqual(depths, [0, 48, 96, 144, 0, 48])
+
+    def test_grabber_stops_at_end_of_session(self):
+        grabber = kinect.FrameGrabber(replay_source(self.base, realtime=False),
+                                      depth_only=True)
+        grabber.start()
+        deadline = time.time() + 5
+        while grabber.is_running() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(grabber.is_running())
+        self.assertEqual(grabber.latest().seq, 4)
+        grabber.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
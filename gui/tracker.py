@@ -0,0 +1,182 @@
+"""
+tracker.py
+
+Follows obstacles from one kinect frame to the next.
+
+Each obstacle found by kinect.extract_obstacles is associated with the
+closest obstacle of the previous frames, so it keeps the same id while it
+moves, and its velocity is estimated. Positions can then be predicted at any
+time, for instance at the game frame rate while the kinect runs at 30 Hz.
+"""
+
+import itertools
+import time
+from collections import namedtuple
+
+import numpy
+
+import kinect
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+__all__ = ['TrackedObstacle', 'ObstacleTracker']
+
+# Returned by the tracker.
+#
+# id            Stable obstacle identifier. Int
+# x, y, width, height, z
+#               Bounding rectangle, see kinect.Obstacle, in centimeters
+# vx, vy        Velocity of the rectangle, in centimeters per second
+# static        Whether the obstacle does not move. Boolean
+# obstacle      The latest detected obstacle. kinect.Obstacle
+TrackedObstacle = namedtuple('TrackedObstacle',
+                             'id x y width height z vx vy static obstacle')
+
+
+class _Track(object):
+    ''' an obstacle followed across frames '''
+    __slots__ = ('id', 'obstacle', 'timestamp', 'vx', 'vy', 'missed')
+
+    def __init__(self, id, obstacle, timestamp):
+        self.id = id
+        self.obstacle = obstacle
+        self.timestamp = timestamp
+        self.vx = 0.0
+        self.vy = 0.0
+        self.missed = 0
+
+    def center_at(self, timestamp):
+        dt = timestamp - self.timestamp
+        o = self.obstacle
+        return (o.x + o.width / 2.0 + self.vx * dt,
+                o.y + o.height / 2.0 + self.vy * dt)
+
+
+class ObstacleTracker(object):
+    '''Gives stable ids and velocities to the obstacles of successive frames.'''
+
+    def __init__(self, max_distance=30.0, max_missed=3, smoothing=0.5,
+                 static_speed=5.0):
+        '''max_distance: farthest an obstacle can go between two frames, in cm
+           max_missed: number of frames an obstacle may be undetected before
+                       being forgotten
+           smoothing: weight of the previous velocity in the new estimate,
+                      from 0 (none) to 1
+           static_speed: obstacles slower than this are static, in cm/s'''
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.smoothing = smoothing
+        self.static_speed = static_speed
+        self._tracks = []
+        self._ids = itertools.count(1)
+        self._last_seq = None
+
+    def update(self, obstacles, timestamp):
+        '''associates the obstacles of a new frame with the tracked ones
+           obstacles: list of kinect.Obstacle
+           timestamp: frame time, in seconds
+           returns the list of TrackedObstacles seen in this frame'''
+        matches = self._associate(obstacles, timestamp)
+
+        matched_tracks = set()
+        seen = []
+        for index, obstacle in enumerate(obstacles):
+            track = matches.get(index)
+            if track is None:
+                track = _Track(next(self._ids), obstacle, timestamp)
+                self._tracks.append(track)
+            else:
+                self._follow(track, obstacle, timestamp)
+            matched_tracks.add(track)
+            seen.append(track)
+
+        for track in self._tracks:
+            if track not in matched_tracks:
+                track.missed += 1
+        self._tracks = [track for track in self._tracks
+                        if track.missed <= self.max_missed]
+
+        return [self._tracked(track, track.timestamp) for track in seen]
+
+    def predict(self, timestamp=None):
+        '''returns all the tracked obstacles, moved to where they should be
+           at timestamp (defaults to now)'''
+        if timestamp is None:
+            timestamp = time.time()
+        return [self._tracked(track, timestamp) for track in self._tracks]
+
+    def poll(self, timestamp=None):
+        '''updates from the latest kinect frame, if it is new, and returns the
+           obstacles predicted at timestamp (defaults to now). See predict.
+           Works best with the background acquisition (kinect.start_acquisition)'''
+        frame = kinect.get_frame(depth_only=True)
+        if frame.seq == 0 or frame.seq != self._last_seq:
+            self._last_seq = frame.seq
+            self.update(kinect.extract_obstacles(frame.data.depth), frame.timestamp)
+        return self.predict(timestamp)
+
+    def _associate(self, obstacles, timestamp):
+        ''' returns {obstacle index: track} '''
+        if not obstacles or not self._tracks:
+            return {}
+
+        predicted = numpy.array([track.center_at(timestamp) for track in self._tracks])
+        centers = numpy.array([(o.x + o.width / 2.0, o.y + o.height / 2.0)
+                               for o in obstacles])
+        distances = numpy.hypot(
+                centers[:, 0, numpy.newaxis] - predicted[numpy.newaxis, :, 0],
+                centers[:, 1, numpy.newaxis] - predicted[numpy.newaxis, :, 1])
+
+        if linear_sum_assignment is not None:
+            gated = numpy.where(distances <= self.max_distance, distances,
+                                self.max_distance * 1000)
+            pairs = zip(*linear_sum_assignment(gated))
+        else:
+            # Greedy: closest pairs first.
+            order = numpy.argsort(distances, axis=None)
+            pairs = zip(*numpy.unravel_index(order, distances.shape))
+
+        matches = {}
+        used = set()
+        for obstacle_index, track_index in pairs:
+            if distances[obstacle_index, track_index] > self.max_distance:
+                continue
+            if obstacle_index in matches or track_index in used:
+                continue
+            matches[obstacle_index] = self._tracks[track_index]
+            used.add(track_index)
+        return matches
+
+    def _follow(self, track, obstacle, timestamp):
+        dt = timestamp - track.timestamp
+        if dt > 0:
+            previous = track.obstacle
+            vx = ((obstacle.x + obstacle.width / 2.0)
+                  - (previous.x + previous.width / 2.0)) / dt
+            vy = ((obstacle.y + obstacle.height / 2.0)
+                  - (previous.y + previous.height / 2.0)) / dt
+            track.vx = self.smoothing * track.vx + (1 - self.smoothing) * vx
+            track.vy = self.smoothing * track.vy + (1 - self.smoothing) * vy
+        track.obstacle = obstacle
+        track.timestamp = timestamp
+        track.missed = 0
+
+    def _tracked(self, track, timestamp):
+        o = track.obstacle
+        dt = timestamp - track.timestamp
+        static = numpy.hypot(track.vx, track.vy) < self.static_speed
+        if static:
+            dt = 0.0
+        return TrackedObstacle(id=track.id,
+                               x=o.x + track.vx * dt,
+                               y=o.y + track.vy * dt,
+                               width=o.width,
+                               height=o.height,
+                               z=o.z,
+                               vx=track.vx,
+                               vy=track.vy,
+                               static=static,
+                               obstacle=o)
@@ -0,0 +1,61 @@
+import unittest
+import kinect
+from kinect import Obstacle
+from tracker import ObstacleTracker
+
+
+def foot(x, y, width=10.0, height=20.0):
+    return Obstacle(x=x, y=y, width=width, height=height, z=0.0, raw_data=None)
+
+
+class ObstacleTrackerTest (unittest.TestCase):
+
+    def test_stable_ids(self):
+        tracker = ObstacleTracker()
+        first = tracker.update([foot(0, 100), foot(100, 100)], 0.0)
+        second = tracker.update([foot(102, 101), foot(3, 100)], 0.1)
+
+        self.assertEqual([t.id for t in first], [1, 2])
+        self.assertEqual([t.id for t in second], [2, 1])
+
+    def test_new_and_lost_obstacles(self):
+        tracker = ObstacleTracker(max_distance=30.0, max_missed=1)
+        tracker.update([foot(0, 100)], 0.0)
+        tracked = tracker.update([foot(200, 100)], 0.1)
+        self.assertEqual([t.id for t in tracked], [2])
+        self.assertEqual(len(tracker.predict(0.1)), 2)
+
+        tracker.update([foot(200, 100)], 0.2)
+        self.assertEqual([t.id for t in tracker.predict(0.2)], [2])
+
+    def test_velocity_and_prediction(self):
+        tracker = ObstacleTracker(smoothing=0.0)
+        tracker.update([foot(0, 100)], 0.0)
+        tracked, = tracker.update([foot(3, 100)], 0.1)
+
+        self.assertAlmostEqual(tracked.vx, 30.0)
+        self.assertAlmostEqual(tracked.vy, 0.0)
+        self.assertFalse(tracked.static)
+
+        predicted, = tracker.predict(0.15)
+        self.assertAlmostEqual(predicted.x, 4.5)
+        self.assertEqual(predicted.obstacle.x, 3)
+
+    def test_static_obstacle_is_not_extrapolated(self):
+        tracker = ObstacleTracker(smoothing=0.0, static_speed=5.0)
+        tracker.update([foot(0, 100)], 0.0)
+        tracker.update([foot(0.1, 100)], 0.1)
+
+        predicted, = tracker.predict(1.0)
+        self.assertTrue(predicted.static)
+        self.assertEqual(predicted.x, 0.1)
+
+    def test_poll(self):
+        tracker = ObstacleTracker()
+        tracked = tracker.poll()
+        self.assertEqual(len(tracked),
+                         len(kinect.extract_obstacles(kinect.get_buffers().depth)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,7 +9,7 @@ Point  -- point with (x,y) coordinates
 import math
 
 
-class Point:
+class Point(object):
     
     """A point identified by (x,y) coordinates.
     
@@ -26,7 +26,10 @@ class Point:
     slide_xy  -- move (in place) +dx, +dy
     rotate  -- rotate around the origin
     rotate_about  -- rotate around another point
+    rotate_about_inplace  -- rotate (in place) around another point
     """
+
+    __slots__ = ('x', 'y')
     
     def __init__(self, x=0.0, y=0.0):
         self.x = x
@@ -113,7 +116,7 @@ class Point:
         
         The new position is returned as a new Point.
         """
-        s, c = [f(rad) for f in (math.sin, math.cos)]
+        s, c = math.sin(rad), math.cos(rad)
         x, y = (c*self.x - s*self.y, s*self.x + c*self.y)
         return Point(x,y)
     
@@ -130,3 +133,14 @@ class Point:
         rotated = temp_point.rotate(theta)
         rotated.slide_xy(p.x, p.y)
         return rotated
+
+    def rotate_about_inplace(self, p, sin, cos):
+        """Rotate (in place) counter-clockwise around a point.
+
+        sin and cos are those of the rotation angle, so they can be computed
+        once for many points.
+        """
+        dx = self.x - p.x
+        dy = self.y - p.y
+        self.x = p.x + cos*dx - sin*dy
+        self.y = p.y + sin*dx + cos*dy
@@ -46,6 +46,16 @@ class PointTest (unittest.TestCase):
         self.assertTrue(are_nearly_equal(rotatedPoint.x , 1))
         self.assertTrue(are_nearly_equal(rotatedPoint.y , 1))
 
+    def test_rotate_about_inplace(self):
+        point = Point(2, 1)
+        point.rotate_about_inplace(Point(1, 1), math.sin(math.pi / 2), math.cos(math.pi / 2))
+        self.assertTrue(are_nearly_equal(point.x , 1))
+        self.assertTrue(are_nearly_equal(point.y , 2))
+
+    def test_slots(self):
+        point = Point(2, 1)
+        self.assertRaises(AttributeError, setattr, point, 'z', 0)
+
 def are_nearly_equal(value1, value2, precision=0.01):
     """
         returns true when the first value is nearly equals to the second
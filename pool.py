@@ -0,0 +1,118 @@
+""" Pools of reusable objects, like the bugs """
+
+import random
+
+__all__ = ['Pool']
+
+
+class Pool(object):
+    """
+    Free objects ready to be reused, created in advance.
+
+    acquire() and release() are O(1). When few free objects are left,
+    maintain() creates some more a few at a time, so an acquire() rarely has
+    to create one itself. It may also destroy the objects left unused for a
+    while, down to the pre-warm size.
+
+    Counters:
+        hits        acquire() returning a free object
+        misses      acquire() creating an object
+        peak        most objects in use at once
+    """
+
+    def __init__(self, factory, prewarm=0, low_water=5, grow_step=5,
+                 shrink_after=None, discard=None, generator=random):
+        """
+        :Parameters:
+            `factory` : callable
+                returns a new object
+            `prewarm` : int
+                objects created at once
+            `low_water` : int
+                maintain() creates objects when fewer are free
+            `grow_step` : int
+                objects created by a maintain() call, at most
+            `shrink_after` : float
+                seconds without miss nor growth after which maintain()
+                destroys the free objects above the pre-warm size. None to
+                never destroy them
+            `discard` : callable
+                invoked with the destroyed objects, if any
+            `generator` : random number generator, like the random module
+                acquire() returns a random free object
+        """
+        self.factory = factory
+        self.prewarm = prewarm
+        self.low_water = low_water
+        self.grow_step = grow_step
+        self.shrink_after = shrink_after
+        self.discard = discard
+        self.generator = generator
+        self._free = []
+        self.in_use = 0
+        self.hits = 0
+        self.misses = 0
+        self.peak = 0
+        self._idle = 0.0    # seconds since the latest miss or growth
+        for i in xrange(prewarm):
+            self._free.append(factory())
+
+    def __len__(self):
+        """ the number of free objects """
+        return len(self._free)
+
+    def acquire(self):
+        """ returns a free object, or a new one when there is none """
+        free = self._free
+        if free:
+            self.hits += 1
+            # swaps a random object with the last one, to pop it in O(1)
+            index = self.generator.randint(0, len(free) - 1)
+            free[index], free[-1] = free[-1], free[index]
+            obj = free.pop()
+        else:
+            self.misses += 1
+            self._idle = 0.0
+            obj = self.factory()
+        self.in_use += 1
+        if self.in_use > self.peak:
+            self.peak = self.in_use
+        return obj
+
+    def release(self, obj):
+        """ gives back an object returned by acquire() """
+        self.in_use -= 1
+        self._free.append(obj)
+
+    def maintain(self, delta_t):
+        """
+        grows or shrinks the pool, to be invoked regularly, at each frame
+        :Parameters:
+            `delta_t` : float
+                seconds since the previous call
+        :rtype: int
+            the number of created objects, negative for destroyed ones
+        """
+        free = self._free
+        if len(free) < self.low_water:
+            self._idle = 0.0
+            count = min(self.grow_step, self.low_water - len(free))
+            for i in xrange(count):
+                free.append(self.factory())
+            return count
+
+        self._idle += delta_t
+        if (self.shrink_after is not None and self._idle >= self.shrink_after
+                and len(free) > self.prewarm):
+            destroyed = free[self.prewarm:]
+            del free[self.prewarm:]
+            if self.discard is not None:
+                for obj in destroyed:
+                    self.discard(obj)
+            return -len(destroyed)
+        return 0
+
+    def stats(self):
+        """ :rtype: dict of the counters, with the free and used counts """
+        return {'free': len(self._free), 'in_use': self.in_use,
+                'hits': self.hits, 'misses': self.misses, 'peak': self.peak}
@@ -0,0 +1,53 @@
+import unittest
+import itertools
+import random
+from pool import Pool
+
+
+class PoolTest (unittest.TestCase):
+
+    def setUp(self):
+        self.counter = itertools.count()
+        self.discarded = []
+
+    def test_prewarm_hits_and_misses(self):
+        pool = self._create_pool(prewarm=3, low_water=0)
+        self.assertEqual(len(pool), 3)
+
+        objs = [pool.acquire() for i in range(4)]
+        self.assertEqual(sorted(objs), [0, 1, 2, 3])
+        self.assertEqual(pool.stats(), {'free': 0, 'in_use': 4, 'hits': 3,
+                                        'misses': 1, 'peak': 4})
+
+        for obj in objs[:2]:
+            pool.release(obj)
+        pool.acquire()
+        self.assertEqual(pool.stats(), {'free': 1, 'in_use': 3, 'hits': 4,
+                                        'misses': 1, 'peak': 4})
+
+    def test_maintain_grows_gradually(self):
+        pool = self._create_pool(prewarm=2, low_water=5, grow_step=2)
+        self.assertEqual(pool.maintain(0.1), 2)
+        self.assertEqual(pool.maintain(0.1), 1)
+        self.assertEqual(pool.maintain(0.1), 0)
+        self.assertEqual(len(pool), 5)
+
+    def test_maintain_shrinks_after_idle(self):
+        pool = self._create_pool(prewarm=2, low_water=0, shrink_after=1.0)
+        objs = [pool.acquire() for i in range(5)]
+        for obj in objs:
+            pool.release(obj)
+
+        self.assertEqual(pool.maintain(0.6), 0)
+        self.assertEqual(pool.maintain(0.6), -3)
+        self.assertEqual(len(pool), 2)
+        self.assertEqual(len(self.discarded), 3)
+        self.assertEqual(pool.peak, 5)
+
+    def _create_pool(self, **kwargs):
+        return Pool(lambda: next(self.counter), discard=self.discarded.append,
+                    generator=random.Random(0), **kwargs)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,263 @@
+import math
+import numpy
+from cocos.euclid import Vector2
+from cshape import OrientableRectShape, shapes_overlap, shapes_square_distance, shapes_near
+
+# Unrotated corners A, B, C, D in half extents units, clockwise from top left.
+_CORNER_SIGNS = numpy.array([[-1.0, 1.0], [1.0, 1.0], [1.0, -1.0], [-1.0, -1.0]])
+
+
+class ShapeBatch(object):
+    """
+    Stores many rectangles with a possible rotation in contiguous arrays,
+    so the corners of all of them are computed in one vectorized pass.
+
+    Each rectangle is handled through a BatchRectShape view, which implements
+    the Cshape interface. Moving or rotating a view only records its new
+    center and angle: corners are recomputed by update(), once per frame,
+    or by BatchRectShape.refresh() for a single shape.
+
+    The slots released by remove() are reused by the next add(). Until then,
+    live marks them as free, and overlapping() never reports them.
+    """
+
+    def __init__(self, capacity=64):
+        """
+        :Parameters:
+            `capacity` : int
+                number of shapes allocated at once, grows as needed
+        """
+        self.centers = numpy.zeros((capacity, 2))
+        self.half_extents = numpy.zeros((capacity, 2))
+        self.angles = numpy.zeros(capacity)           # degrees
+        self.corners = numpy.zeros((capacity, 4, 2))  # A, B, C, D
+        self.bounds = numpy.zeros((capacity, 4))      # minmax() of the shapes
+        self.live = numpy.zeros(capacity, dtype=bool)  # whether a slot is in use
+        # cosine and sine of the angles, computed again only for the slots
+        # whose angle differs from the one they were computed for
+        self._cos = numpy.zeros(capacity)
+        self._sin = numpy.zeros(capacity)
+        self._trig_angles = numpy.empty(capacity)
+        self._trig_angles.fill(numpy.nan)
+        # corners and bounds as python lists, converted once per computation
+        # so that the pair tests read them without allocating
+        self._corner_rows = [None] * capacity
+        self._bound_rows = [None] * capacity
+        self.size = 0           # slots in use are below size
+        self._free_slots = []
+
+    def add(self, center_x, center_y, half_width, half_height, angle):
+        """
+        Adds a rectangle to the batch
+        :rtype: BatchRectShape
+            the view on the new rectangle
+        """
+        if self._free_slots:
+            slot = self._free_slots.pop()
+        else:
+            if self.size == len(self.angles):
+                self._grow()
+            slot = self.size
+            self.size += 1
+        self.centers[slot] = center_x, center_y
+        self.half_extents[slot] = half_width, half_height
+        self.angles[slot] = angle
+        self.live[slot] = True
+        shape = BatchRectShape(self, slot)
+        shape.refresh()
+        return shape
+
+    def remove(self, shape):
+        """ releases the slot of a shape, which must not be used anymore """
+        self.live[shape.slot] = False
+        self._free_slots.append(shape.slot)
+        shape.batch = None
+
+    def update(self):
+        """ computes the corners of all the shapes. Free slots below size
+            are computed as well: skipping them would cost more than it saves """
+        self._compute_corners(slice(0, self.size))
+
+    def overlapping(self, shape, slots=None):
+        """
+        Tests one shape against many shapes of the batch at once
+        :Parameters:
+            `shape` : a Cshape with corners(), like BatchRectShape
+            `slots` : the slots of the tested shapes, defaults to all
+        :rtype: numpy array of bool
+            whether the shape overlaps each tested shape, itself included.
+            Always False for a free slot
+        """
+        if slots is None:
+            slots = slice(0, self.size)
+        return (rectangles_overlap_many(numpy.asarray(shape.corners()),
+                                        self.corners[slots])
+                & self.live[slots])
+
+    def _compute_corners(self, slots):
+        angles = self.angles[slots]
+        trig_angles = self._trig_angles[slots]    # views, slots being a slice
+        changed = angles != trig_angles
+        if changed.any():
+            rad = numpy.radians(angles[changed])
+            self._cos[slots][changed] = numpy.cos(rad)
+            self._sin[slots][changed] = numpy.sin(rad)
+            trig_angles[changed] = angles[changed]
+        cos = self._cos[slots][:, numpy.newaxis]
+        sin = self._sin[slots][:, numpy.newaxis]
+        # offsets of the unrotated corners from the centers
+        offsets = _CORNER_SIGNS * self.half_extents[slots][:, numpy.newaxis, :]
+        dx = offsets[:, :, 0]
+        dy = offsets[:, :, 1]
+        centers = self.centers[slots]
+        corners = self.corners[slots]   # a view, slots being a slice
+        corners[:, :, 0] = cos * dx - sin * dy + centers[:, 0, numpy.newaxis]
+        corners[:, :, 1] = sin * dx + cos * dy + centers[:, 1, numpy.newaxis]
+        bounds = self.bounds[slots]
+        corners[:, :, 0].min(axis=1, out=bounds[:, 0])
+        corners[:, :, 0].max(axis=1, out=bounds[:, 1])
+        corners[:, :, 1].min(axis=1, out=bounds[:, 2])
+        corners[:, :, 1].max(axis=1, out=bounds[:, 3])
+        self._corner_rows[slots] = corners.tolist()
+        self._bound_rows[slots] = map(tuple, bounds.tolist())
+
+    def _grow(self):
+        capacity = 2 * len(self.angles)
+        for name in ('centers', 'half_extents', 'angles', 'corners', 'bounds',
+                     'live', '_cos', '_sin', '_trig_angles'):
+            old = getattr(self, name)
+            new = numpy.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            if name == '_trig_angles':
+                new[len(old):] = numpy.nan
+            setattr(self, name, new)
+        grown = capacity - len(self._corner_rows)
+        self._corner_rows.extend([None] * grown)
+        self._bound_rows.extend([None] * grown)
+
+
+class BatchRectShape(object):
+    """
+    View on one rectangle of a ShapeBatch.
+    Implements the Cshape interface, like OrientableRectShape.
+
+    Look at Cshape for other class and methods documentation.
+    """
+
+    def __init__(self, batch, slot):
+        self.batch = batch
+        self.slot = slot
+
+    def move_to(self, x, y):
+        """ moves the center of the shape to (x, y), see ShapeBatch """
+        self.batch.centers[self.slot] = x, y
+
+    def move_by(self, dx, dy):
+        ''' moves the shape
+            dx distance in pixels along horizontal axis
+            dy distance in pixels along vertical axis
+        '''
+        self.batch.centers[self.slot] += dx, dy
+
+    def rotate(self, angle):
+        """
+        :Parameters:
+            'angle': float
+                the new rotation of the shape, in degrees
+        """
+        self.batch.angles[self.slot] = angle
+
+    def refresh(self):
+        """ computes the corners of this shape only """
+        self.batch._compute_corners(slice(self.slot, self.slot + 1))
+
+    @property
+    def center(self):
+        """ :rtype: euclid.Vector2, a copy: use move_to to move the shape """
+        x, y = self.batch.centers[self.slot]
+        return Vector2(float(x), float(y))
+
+    @property
+    def angle(self):
+        return self.batch.angles[self.slot]
+
+    def corners(self):
+        """ :rtype: list of the [x, y] coordinates of A, B, C, D, as of the
+            last corners computation. Shared: do not modify it """
+        return self.batch._corner_rows[self.slot]
+
+    def overlaps(self, other):
+        if self is other:
+            return False
+
+        return shapes_overlap(self, other)
+
+    def distance(self, other):
+        return math.sqrt(shapes_square_distance(self, other))
+
+    def near_than(self, other, near_distance):
+        return shapes_near(self, other, near_distance)
+
+    def touches_point(self, x, y):
+        return _touches(self.corners(), (x, y))
+
+    def fits_in_box(self, packed_box):
+        minmax = self.minmax()
+        return (packed_box[0] <= minmax[0]
+            and packed_box[1] >= minmax[1]
+            and packed_box[2] <= minmax[2]
+            and packed_box[3] >= minmax[3])
+
+    def minmax(self):
+        return self.batch._bound_rows[self.slot]
+
+    def copy(self):
+        """ returns an independent OrientableRectShape, out of the batch """
+        half_width, half_height = self.batch.half_extents[self.slot]
+        return OrientableRectShape(self.center, half_width, half_height,
+                                   self.angle)
+
+    def __repr__(self):
+        return " ".join("Point(%r, %r)" % (x, y) for x, y in self.corners())
+
+
+def rectangles_overlap_many(corners, others):
+    """
+    Vectorized rectangles_overlap of one rectangle against many
+    :Parameters:
+        `corners` : (4, 2) array, the corners of the rectangle
+        `others` : (n, 4, 2) array, the corners of the other rectangles
+    :rtype: (n,) array of bool
+    """
+    # edge directions, 2 per rectangle: (2, 2) and (n, 2, 2)
+    axes = corners[1:3] - corners[0:2]
+    other_axes = others[:, 1:3] - others[:, 0:2]
+
+    # projections on the rectangle axes: (2, 4) and (n, 2, 4)
+    p1 = numpy.dot(axes, corners.T)
+    p2 = numpy.einsum('aj,nkj->nak', axes, others)
+    apart = ((p1.max(axis=1) <= p2.min(axis=2))
+             | (p2.max(axis=2) <= p1.min(axis=1))).any(axis=1)
+
+    # projections on the other rectangles axes: (n, 2, 4) both
+    p1 = numpy.einsum('naj,kj->nak', other_axes, corners)
+    p2 = numpy.einsum('naj,nkj->nak', other_axes, others)
+    apart |= ((p1.max(axis=2) <= p2.min(axis=2))
+              | (p2.max(axis=2) <= p1.min(axis=2))).any(axis=1)
+    return ~apart
+
+
+def _touches(corners, point):
+    """ whether point is strictly inside the clockwise corners, see
+        OrientableRectShape.touches """
+    (ax, ay), (bx, by), (cx, cy), (dx, dy) = corners
+    x, y = point
+    return (_triangle_area(ax, ay, bx, by, x, y) > 0
+        and _triangle_area(bx, by, cx, cy, x, y) > 0
+        and _triangle_area(cx, cy, dx, dy, x, y) > 0
+        and _triangle_area(dx, dy, ax, ay, x, y) > 0)
+
+
+def _triangle_area(ax, ay, bx, by, cx, cy):
+    """ the double of the area of the clockwise ABC triangle """
+    return (cx*by-bx*cy)-(cx*ay-ax*cy)+(bx*ay-ax*by)
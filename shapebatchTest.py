@@ -0,0 +1,156 @@
+import unittest
+import math
+import random
+from cshape import OrientableRectShape
+from cocos import euclid
+from cshape import shapes_overlap
+from shapebatch import ShapeBatch
+
+
+class ShapeBatchTest (unittest.TestCase):
+
+    def test_corners_as_orientable_rect_shape(self):
+        batch = ShapeBatch(capacity=4)
+        generator = random.Random(0)
+        pairs = []
+        for i in range(20):
+            x, y = generator.uniform(-50, 50), generator.uniform(-50, 50)
+            half_width, half_height = generator.uniform(1, 10), generator.uniform(1, 10)
+            angle = generator.uniform(-180, 180)
+            pairs.append((batch.add(x, y, half_width, half_height, angle),
+                          OrientableRectShape(euclid.Vector2(x, y),
+                                              half_width, half_height, angle)))
+
+        for shape, expected in pairs:
+            for corner, expected_corner in zip(shape.corners(), expected.corners()):
+                self.assertTrue(are_nearly_equal(corner[0], expected_corner[0]))
+                self.assertTrue(are_nearly_equal(corner[1], expected_corner[1]))
+            for value, expected_value in zip(shape.minmax(), expected.minmax()):
+                self.assertTrue(are_nearly_equal(value, expected_value))
+
+    def test_update_after_move(self):
+        batch = ShapeBatch()
+        shape = batch.add(1, 2, 1, 1, 0)
+        shape.move_to(5, 5)
+        shape.rotate(90)
+        self.assertEqual(shape.minmax(), (0, 2, 1, 3))    # not updated yet
+
+        batch.update()
+        minmax = shape.minmax()
+        for value, expected in zip(minmax, (4, 6, 4, 6)):
+            self.assertTrue(are_nearly_equal(value, expected))
+
+        shape.move_by(1, -1)
+        shape.refresh()
+        self.assertTrue(are_nearly_equal(shape.minmax()[0], 5))
+
+    def test_queries_do_not_allocate(self):
+        batch = ShapeBatch(capacity=1)
+        shapes = [batch.add(i * 10, 0, 1, 1, 0) for i in range(3)]
+        minmax, corners = shapes[2].minmax(), shapes[2].corners()
+        self.assertTrue(shapes[2].minmax() is minmax)
+        self.assertTrue(shapes[2].corners() is corners)
+        self.assertEqual(minmax, (19, 21, -1, 1))
+
+        shapes[2].move_by(0, 5)
+        batch.update()
+        self.assertEqual(shapes[2].minmax(), (19, 21, 4, 6))
+        self.assertEqual(shapes[2].corners(), [[19, 6], [21, 6], [21, 4], [19, 4]])
+
+    def test_trigonometry_cached(self):
+        batch = ShapeBatch(capacity=1)
+        shape1 = batch.add(0, 0, 2, 1, 30)
+        shape2 = batch.add(0, 0, 2, 1, 0)
+        batch._cos[shape1.slot] = 0.5  # stale value, kept while the angle is
+        batch.update()
+        self.assertNotEqual(shape1.corners(), shape1.copy().corners())
+
+        shape1.rotate(60)
+        shape2.rotate(60)
+        batch.update()
+        for shape in (shape1, shape2):
+            for corner, expected in zip(shape.corners(), shape.copy().corners()):
+                self.assertTrue(are_nearly_equal(corner[0], expected[0]))
+                self.assertTrue(are_nearly_equal(corner[1], expected[1]))
+
+    def test_overlaps(self):
+        batch = ShapeBatch()
+        shape1 = batch.add(1, 2, 1, 1, 0)
+        shape2 = batch.add(2, 3, 1, 1, 45)
+        shape3 = batch.add(4, 2, 1, 1, 60)
+
+        self.assertTrue(shape1.overlaps(shape2))
+        self.assertTrue(shape2.overlaps(shape1))
+        self.assertFalse(shape1.overlaps(shape3))
+        self.assertFalse(shape1.overlaps(shape1))
+        self.assertTrue(shape1.overlaps(shape1.copy()))
+
+    def test_overlapping_many(self):
+        batch = ShapeBatch()
+        generator = random.Random(1)
+        shapes = [batch.add(generator.uniform(0, 30), generator.uniform(0, 30),
+                            generator.uniform(1, 8), generator.uniform(1, 8),
+                            generator.uniform(-90, 90))
+                  for i in range(40)]
+
+        for shape in shapes[:10]:
+            overlapping = batch.overlapping(shape)
+            self.assertEqual(list(overlapping),
+                             [other is shape or shapes_overlap(shape, other)
+                              for other in shapes])
+
+        slots = [shapes[3].slot, shapes[7].slot]
+        self.assertEqual(len(batch.overlapping(shapes[0], slots)), 2)
+        self.assertEqual(len(batch.overlapping(shapes[0], [])), 0)
+
+    def test_touches_point_and_distance(self):
+        batch = ShapeBatch()
+        shape1 = batch.add(1, 2, 1, 1, 0)
+        shape2 = batch.add(4, 2, 1, 1, 0)
+
+        self.assertTrue(shape1.touches_point(0.5, 1.5))
+        self.assertFalse(shape1.touches_point(3, 2))
+        self.assertEqual(shape1.distance(shape2), 1)
+        self.assertTrue(shape1.near_than(shape2, 1))
+        self.assertTrue(shape1.fits_in_box((0, 2, 1, 3)))
+
+    def test_slots_reused(self):
+        batch = ShapeBatch(capacity=2)
+        shapes = [batch.add(i, 0, 1, 1, 0) for i in range(3)]
+        self.assertEqual(batch.size, 3)
+
+        batch.remove(shapes[1])
+        shape = batch.add(10, 0, 1, 1, 0)
+        self.assertEqual(shape.slot, 1)
+        self.assertEqual(batch.size, 3)
+        self.assertEqual(shapes[2].center, (2, 0))
+
+    def test_free_slots_never_overlap(self):
+        batch = ShapeBatch()
+        shapes = [batch.add(i, 0, 1.5, 1, 0) for i in range(3)]
+        batch.remove(shapes[1])
+        batch.update()
+        self.assertEqual(list(batch.overlapping(shapes[0])), [True, False, True])
+
+        shape = batch.add(1, 0, 1, 1, 0)
+        self.assertEqual(list(batch.overlapping(shape)), [True, True, True])
+
+    def test_center_is_a_vector(self):
+        shape = ShapeBatch().add(3, 4, 1, 1, 0)
+        center = shape.center
+        self.assertEqual((center.x, center.y), (3, 4))
+        x, y = center
+        self.assertEqual((x, y), (3, 4))
+        self.assertEqual(center, (3, 4))
+
+
+def are_nearly_equal(value1, value2, precision=0.01):
+    """
+        returns true when the first value is nearly equals to the second
+    """
+    delta = math.fabs(value1 - value2)
+    return delta <= precision
+
+
+if __name__ == '__main__':
+    unittest.main()
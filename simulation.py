@@ -0,0 +1,373 @@
+""" Bug Arena rules, and a headless simulation of the game
+
+The rules are shared with BugsArena.py. The Simulation runs them without
+window nor rendering, as fast as possible, and with its own random
+generator so a seed always gives the same game.
+
+usage: python simulation.py [--steps STEPS] [--seed SEED] [--width WIDTH]
+                            [--height HEIGHT] [--spawn-interval SECONDS]
+                            [--bugs-per-spawn N] [--sweep] [--profile]
+"""
+
+import argparse
+import math
+import random
+import sys
+import timeit
+
+if __name__ == '__main__':
+    # Headless: the shapes use cocos.euclid, and importing cocos must not
+    # need a display. The game, which imports these rules, keeps its windows.
+    import pyglet
+    pyglet.options['shadow_window'] = False
+
+from shapebatch import ShapeBatch
+from collision import GridCollisionManager, SweepAndPruneCollisionManager
+from pool import Pool
+from activeset import ActiveSet
+from spawn import SpawnAllocator, sway_half_width
+
+__all__ = ['PlayerState', 'choose_kind', 'bug_speed', 'spawn_location',
+           'spawn_half_width', 'sway_rotation', 'step_move', 'find_blocked_bugs',
+           'HeadlessBug', 'Simulation']
+
+# Size of an animation frame of the bug images, in pixels.
+IMAGE_SIZES = {'bug1-small.png': (70, 168),
+               'bug2-small.png': (106, 121)}
+
+MAX_DURATION = 8    # seconds, for the slowest bugs to cross the screen
+
+# Bugs move down at least this fast, in pixels per second: the 0.2 pixel per
+# frame minimum of the game, when it moved the bugs at each frame, at 60 fps.
+MIN_SPEED = 12.0
+
+# How far below the top of the screen a bug spawned rotated may reach.
+SPAWN_MARGIN = max(width / 2.0 * math.sin(math.radians(MAX_DURATION))
+                   for width, height in IMAGE_SIZES.values())
+
+
+class PlayerState(object):
+    """ score and life of the player """
+
+    def __init__(self):
+        self.MAX_LIFE = 100
+        self.LIFE_POINT_PER_BUG = 50
+        self.reset()
+
+    def reset(self):
+        ''' turns player to its initial state: full life, no points'''
+        self.score = 0
+        self.life = self.MAX_LIFE
+
+    def add_points(self, points):
+        """ increase player score
+            points: the  number of points to add to the score
+        """
+        self.score += points
+
+    def remove_life_points(self):
+        """ decrease player life points, if it is positive
+            returns whether the player is still alive
+        """
+        if self.life >= self.LIFE_POINT_PER_BUG:
+            self.life -= self.LIFE_POINT_PER_BUG
+        else:
+            self.life = 0
+        return self.life > 0
+
+
+def choose_kind(generator):
+    ''' returns the duration, value and image of a new bug
+        duration: the time in second for the bug to go to the bottom of
+        the screen
+        generator: random number generator, like the random module '''
+    duration = generator.randint(2, MAX_DURATION)
+    if duration < 5:
+        return duration, 1000, 'bug1-small.png'
+    return duration, 500, 'bug2-small.png'
+
+
+def bug_speed(screen_height, bug_height, duration):
+    ''' returns the speed of a bug, see step_move '''
+    return (screen_height + bug_height) / duration
+
+
+def spawn_location(spawn_x, bug_height, screen_height):
+    ''' returns the location of a bug on top of the screen, out of sight
+        spawn_x: chosen by a SpawnAllocator '''
+    return (spawn_x, screen_height + bug_height / 2)
+
+
+def spawn_half_width(bug):
+    ''' returns the half width of the room a bug needs to sway, for the
+        SpawnAllocator '''
+    return sway_half_width(bug.width / 2.0, bug.height / 2.0, bug.duration)
+
+
+def sway_rotation(duration, elapsed):
+    ''' returns the rotation of a bug swaying from -duration to duration
+        degrees and back, every 2 seconds, started elapsed seconds ago.
+        Computed at each simulation step, by BugsArena.Bug too '''
+    phase = elapsed % 2.0
+    if phase < 1.0:
+        return -duration + 2 * duration * phase
+    return duration - 2 * duration * (phase - 1.0)
+
+
+def step_move(bug, delta_t, screen_width):
+    ''' returns the (delta_x, delta_y) move of a bug for a simulation step,
+        delta_y being positive downward
+        delta_t: the duration of the step, in seconds '''
+    delta_y = max(bug.speed * delta_t / bug.duration, MIN_SPEED * delta_t)
+
+    if bug.rotation > 180:
+        rotation = bug.rotation - 360
+    else:
+        rotation = bug.rotation
+
+    delta_x = - delta_y * math.sin(rotation)
+    bug_x = bug.location[0]
+    if bug_x - bug.width < 0 and delta_x < 0:
+        delta_x = 0
+    elif bug_x + bug.width > screen_width and delta_x > 0:
+        delta_x = 0
+    return delta_x, delta_y
+
+
+def find_blocked_bugs(collision_manager):
+    ''' returns the set of the bugs blocked by a colliding bug, which is in
+        front of them: its top is below theirs. Bugs with the same top
+        block each other.
+        Each colliding pair is tested once, see iter_all_collisions '''
+    blocked_bugs = set()
+    tops = {}   # computed once per bug
+    for bug1, bug2 in collision_manager.iter_all_collisions():
+        for bug in (bug1, bug2):
+            if bug not in tops:
+                tops[bug] = bug.top()
+        if tops[bug1] >= tops[bug2]:
+            blocked_bugs.add(bug1)
+        if tops[bug2] >= tops[bug1]:
+            blocked_bugs.add(bug2)
+    return blocked_bugs
+
+
+class HeadlessBug(object):
+    ''' A bug without sprite, see BugsArena.Bug '''
+
+    def __init__(self, simulation):
+        self.simulation = simulation
+        self.duration, self.value, image = choose_kind(simulation.random)
+        self.width, self.height = IMAGE_SIZES[image]
+        screen_height = simulation.screen_size[1]
+        self.speed = bug_speed(screen_height, self.height, self.duration)
+        self.rotation = 0
+        self.start_time = 0.0
+        self.location = self.previous_location = (0, 0)
+        self.cshape = simulation.shape_batch.add(0, 0, self.width / 2,
+                                                 self.height / 2, 0)
+
+    def start(self, spawn_x):
+        ''' places the bug to its start position
+            spawn_x: its horizontal position, see spawn_location '''
+        self.rotation = -self.duration
+        self.start_time = self.simulation.time
+        screen_height = self.simulation.screen_size[1]
+        self.location = self.previous_location = spawn_location(
+                spawn_x, self.height, screen_height)
+        self.cshape.move_to(*self.location)
+        self.cshape.rotate(self.rotation)
+        self.cshape.refresh()
+
+    def move_by(self, delta_x, delta_y):
+        ''' moves the bug
+            delta_x distance in pixels along horizontal axis
+            delta_y distance in pixels along vertical axis '''
+        self.location = (self.location[0] + delta_x, self.location[1] + delta_y)
+        self.cshape.move_to(*self.location)
+        self.cshape.rotate(self.rotation)
+
+    def top(self):
+        return self.location[1] + self.height / 2.0
+
+
+class Simulation(object):
+    ''' The game rules, without rendering '''
+
+    STEP = 1 / 60.0     # duration of a simulation step, in seconds
+
+    def __init__(self, seed=None, screen_size=(640, 480), spawn_interval=1.0,
+                 bugs_per_spawn=1, sweep_and_prune=False, endless=False,
+                 prewarm=50):
+        ''' seed: seed of the random generator, the same seed giving the
+                  same game
+            screen_size: (width, height) of the arena, in pixels
+            spawn_interval: seconds between two bug creations
+            bugs_per_spawn: bugs created at once
+            sweep_and_prune: whether to find the colliding bugs by sweep and
+                  prune rather than with a grid, see BugsArena.BugLayer
+            endless: whether to go on when the player has no life left
+            prewarm: bugs created in advance, see BugsArena.GameModel '''
+        self.random = random.Random(seed)
+        self.screen_size = screen_size
+        self.spawn_interval = spawn_interval
+        self.bugs_per_spawn = bugs_per_spawn
+        self.endless = endless
+        self.shape_batch = ShapeBatch()
+        if sweep_and_prune:
+            self.collision_manager = SweepAndPruneCollisionManager()
+        else:
+            self.collision_manager = GridCollisionManager(100, 190)
+        self.player = PlayerState()
+        self.active_bugs = ActiveSet()
+        self.spawn_allocator = SpawnAllocator(screen_size[0],
+                                              screen_size[1] - SPAWN_MARGIN)
+        self.missed_spawns = 0  # no room left on top of the screen
+        self.bug_pool = Pool(lambda: HeadlessBug(self), prewarm=prewarm,
+                             low_water=5, grow_step=1, shrink_after=30.0,
+                             discard=self.discard_bug,
+                             generator=self.random)
+        self.steps = 0
+        self.time = 0.0
+        self.next_spawn = spawn_interval
+        self.killed_bugs = 0    # reached the bottom of the screen
+        self.is_over = False
+
+    def create_bug(self):
+        ''' Get a bug instance from the pool or
+            creates one when the pool is empty.
+            Then add it to the game, see BugsArena.GameModel.activate_bug
+            returns the bug, or None when there is no room for it '''
+        bug = self.bug_pool.acquire()
+        half_width = spawn_half_width(bug)
+        spawn_x = self.spawn_allocator.sample(self.random, half_width)
+        if spawn_x is None:
+            self.bug_pool.release(bug)
+            self.missed_spawns += 1
+            return None
+        bug.start(spawn_x)
+        self.active_bugs.add(bug)
+        self.collision_manager.add(bug)
+        self.spawn_allocator.add(bug, half_width)
+        return bug
+
+    def kill_bug(self, bug):
+        ''' removes a bug from the game at the next flush_killed_bugs(),
+            see BugsArena.GameModel.kill_bug '''
+        self.active_bugs.kill(bug)
+
+    def flush_killed_bugs(self):
+        ''' puts the killed bugs out of the game '''
+        for bug in self.active_bugs.flush():
+            self.bug_pool.release(bug)
+            self.collision_manager.remove_tricky(bug)
+            self.spawn_allocator.remove(bug)
+
+    def discard_bug(self, bug):
+        ''' destroys a bug the pool does not need anymore '''
+        self.shape_batch.remove(bug.cshape)
+
+    def hit(self, x, y):
+        ''' the player hits point (x, y): kills the bugs there
+            returns the number of killed bugs '''
+        bugs = self.collision_manager.objs_touching_point(x, y)
+        for bug in bugs:
+            self.player.add_points(bug.value)
+            self.kill_bug(bug)
+        self.flush_killed_bugs()
+        return len(bugs)
+
+    def step(self):
+        ''' runs a simulation step, see BugsArena.cb_update '''
+        if self.is_over:
+            return
+        self.steps += 1
+        self.time = self.steps * self.STEP
+        self.bug_pool.maintain(self.STEP)
+        while self.time >= self.next_spawn:
+            for i in xrange(self.bugs_per_spawn):
+                self.create_bug()
+            self.next_spawn += self.spawn_interval
+
+        for bug in self.active_bugs:
+            bug.previous_location = bug.location
+            bug.rotation = sway_rotation(bug.duration, self.time - bug.start_time)
+
+        self.shape_batch.update()
+        self.collision_manager.update()
+        blocked_bugs = find_blocked_bugs(self.collision_manager)
+
+        screen_width = self.screen_size[0]
+        for bug in self.active_bugs:
+            if bug in blocked_bugs:
+                continue
+            delta_x, delta_y = step_move(bug, self.STEP, screen_width)
+            bug.move_by(delta_x, -delta_y)
+
+            if bug.location[1] < 0:
+                self.killed_bugs += 1
+                self.kill_bug(bug)
+                if not self.player.remove_life_points() and not self.endless:
+                    self.is_over = True
+                    break
+
+        self.flush_killed_bugs()
+
+    def run(self, steps):
+        ''' runs steps simulation steps, or less if the game is over
+            returns the number of steps run '''
+        for i in xrange(steps):
+            if self.is_over:
+                return i
+            self.step()
+        return steps
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Run Bug Arena without display.')
+    parser.add_argument('--steps', type=int, default=60 * 60,
+                        help='simulation steps, 60 per second of game')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the random generator')
+    parser.add_argument('--width', type=int, default=640, help='arena width')
+    parser.add_argument('--height', type=int, default=480, help='arena height')
+    parser.add_argument('--spawn-interval', type=float, default=1.0,
+                        help='seconds between two bug creations')
+    parser.add_argument('--bugs-per-spawn', type=int, default=1,
+                        help='bugs created at once')
+    parser.add_argument('--sweep', action='store_true',
+                        help='sweep and prune rather than a grid')
+    parser.add_argument('--profile', action='store_true',
+                        help='print the profile of the simulation')
+    options = parser.parse_args(argv)
+
+    simulation = Simulation(options.seed, (options.width, options.height),
+                            options.spawn_interval, options.bugs_per_spawn,
+                            options.sweep, endless=True)
+    bug_counts = []
+
+    def run():
+        for i in xrange(options.steps):
+            simulation.step()
+            bug_counts.append(len(simulation.active_bugs))
+
+    start = timeit.default_timer()
+    if options.profile:
+        import cProfile
+        cProfile.runctx('run()', globals(), locals(), sort='tottime')
+    else:
+        run()
+    duration = timeit.default_timer() - start
+
+    print '%d steps in %.2f s: %.0f steps per second' % (
+            options.steps, duration, options.steps / duration)
+    print 'bugs: %.1f on average, %d at most, %d reached the bottom, %d found no room' % (
+            float(sum(bug_counts)) / len(bug_counts), max(bug_counts),
+            simulation.killed_bugs, simulation.missed_spawns)
+    print 'pool: %(free)d free, %(peak)d used at most, %(hits)d hits, %(misses)d misses' % (
+            simulation.bug_pool.stats())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
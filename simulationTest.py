@@ -0,0 +1,152 @@
+import unittest
+import math
+import pyglet
+pyglet.options['shadow_window'] = False     # cocos must not need a display
+from simulation import (Simulation, sway_rotation, PlayerState, find_blocked_bugs,
+                        step_move, bug_speed, MIN_SPEED)
+from collision import GridCollisionManager, SweepAndPruneCollisionManager
+from shapebatch import ShapeBatch
+
+
+class SimulationTest (unittest.TestCase):
+
+    def test_same_seed_same_game(self):
+        simulations = [Simulation(seed=4, spawn_interval=0.2) for i in range(2)]
+        for simulation in simulations:
+            simulation.run(60 * 20)
+
+        self.assertTrue(simulations[0].killed_bugs > 0)
+        self.assertEqual(*[(s.steps, s.killed_bugs, s.player.life, s.is_over)
+                           for s in simulations])
+        self.assertEqual(*[[bug.location for bug in s.active_bugs]
+                           for s in simulations])
+
+    def test_bugs_walk_down(self):
+        simulation = Simulation(seed=1)
+        simulation.run(60)
+        self.assertEqual(len(simulation.active_bugs), 1)
+        bug, = simulation.active_bugs
+        start_y = bug.location[1]
+        simulation.run(30)
+        self.assertTrue(bug.location[1] < start_y)
+        self.assertEqual(bug.cshape.center, bug.location)
+
+    def test_game_over(self):
+        simulation = Simulation(seed=2, spawn_interval=0.1)
+        steps = simulation.run(60 * 60)
+        self.assertTrue(simulation.is_over)
+        self.assertTrue(steps < 60 * 60)
+        self.assertEqual(simulation.player.life, 0)
+        self.assertEqual(simulation.killed_bugs, 2)
+
+    def test_spawn_in_free_space(self):
+        simulation = Simulation(seed=5, spawn_interval=0.05, endless=True)
+        for i in range(60 * 10):
+            simulation.step()
+            for bug in simulation.active_bugs:
+                if bug.start_time == simulation.time:   # just spawned
+                    self.assertEqual(list(simulation.collision_manager.iter_colliding(bug)), [])
+        self.assertTrue(simulation.missed_spawns > 0)
+
+    def test_hit(self):
+        simulation = Simulation(seed=3)
+        simulation.run(90)
+        bug, = simulation.active_bugs
+        x, y = bug.location
+        self.assertEqual(simulation.hit(x, y), 1)
+        self.assertEqual(simulation.player.score, bug.value)
+        self.assertEqual(len(simulation.active_bugs), 0)
+        self.assertEqual(simulation.hit(x, y), 0)
+
+    def test_sway_rotation(self):
+        self.assertTrue(are_nearly_equal(sway_rotation(4, 0), -4))
+        self.assertTrue(are_nearly_equal(sway_rotation(4, 0.5), 0))
+        self.assertTrue(are_nearly_equal(sway_rotation(4, 1), 4))
+        self.assertTrue(are_nearly_equal(sway_rotation(4, 1.75), -2))
+        self.assertTrue(are_nearly_equal(sway_rotation(4, 2), -4))
+
+    def test_minimum_speed(self):
+        bug = Simulation(seed=1).bug_pool.acquire()
+        bug.location = (320, 200)
+        bug.duration = 8
+        bug.speed = bug_speed(480, 168, 8)      # 10.1 pixels per second
+        self.assertTrue(are_nearly_equal(step_move(bug, 1 / 60.0, 640)[1], 0.2))
+
+        bug.duration = 2
+        bug.speed = bug_speed(480, 168, 2)
+        self.assertTrue(are_nearly_equal(step_move(bug, 1 / 60.0, 640)[1],
+                                         bug.speed / 2 / 60.0))
+        self.assertTrue(bug.speed / 2 > MIN_SPEED)
+
+    def test_player_life(self):
+        player = PlayerState()
+        self.assertTrue(player.remove_life_points())
+        self.assertFalse(player.remove_life_points())
+        self.assertEqual(player.life, 0)
+
+
+class Thing(object):
+    """ a bug in a collision manager """
+    def __init__(self, batch, x, y):
+        self.cshape = batch.add(x, y, 5, 5, 0)
+        self.top_calls = 0
+
+    def top(self):
+        self.top_calls += 1
+        return self.cshape.minmax()[3]
+
+
+class PairsManager(object):
+    """ a collision manager yielding given pairs """
+    def __init__(self, pairs):
+        self.pairs = pairs
+
+    def iter_all_collisions(self):
+        return iter(self.pairs)
+
+
+class FindBlockedBugsTest (unittest.TestCase):
+
+    def setUp(self):
+        batch = ShapeBatch()
+        self.behind = Thing(batch, 0, 10)      # top higher than in_front one
+        self.in_front = Thing(batch, 4, 8)
+        self.side1 = Thing(batch, 30, 8)       # same top
+        self.side2 = Thing(batch, 34, 8)
+        self.things = [self.behind, self.in_front, self.side1, self.side2]
+
+    def test_higher_top_is_blocked(self):
+        manager = PairsManager([(self.in_front, self.behind)])
+        self.assertEqual(find_blocked_bugs(manager), set([self.behind]))
+
+    def test_same_top_block_each_other(self):
+        manager = PairsManager([(self.side1, self.side2)])
+        self.assertEqual(find_blocked_bugs(manager),
+                         set([self.side1, self.side2]))
+
+    def test_each_pair_once(self):
+        manager = PairsManager([(self.behind, self.in_front),
+                                (self.side2, self.side1),
+                                (self.behind, self.side1)])
+        self.assertEqual(find_blocked_bugs(manager),
+                         set([self.behind, self.side1, self.side2]))
+        self.assertEqual([thing.top_calls for thing in self.things], [1, 1, 1, 1])
+
+    def test_collision_managers(self):
+        expected = set([self.behind, self.side1, self.side2])
+        for manager in [GridCollisionManager(15, 15), SweepAndPruneCollisionManager()]:
+            for thing in self.things:
+                manager.add(thing)
+            self.assertEqual(find_blocked_bugs(manager), expected)
+
+
+def are_nearly_equal(value1, value2, precision=0.01):
+    """
+        returns true when the first value is nearly equals to the second
+    """
+    delta = math.fabs(value1 - value2)
+    return delta <= precision
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+""" Placement of the new bugs along the top of the screen """
+
+import bisect
+import math
+from operator import itemgetter
+
+__all__ = ['SpawnAllocator', 'sway_half_width']
+
+
+def sway_half_width(half_width, half_height, max_angle):
+    ''' returns the half width of the bounding box of a rectangle rotated
+        up to max_angle degrees, either way '''
+    rad = math.radians(min(abs(max_angle), 90))
+    return half_width * math.cos(rad) + half_height * math.sin(rad)
+
+
+class SpawnAllocator(object):
+    """
+    Free space of the spawn strip, above the top of the screen.
+
+    Bugs spawn with their bottom on the top of the screen, so a new bug may
+    only collide with the bugs still crossing it. The allocator keeps the
+    horizontal intervals of these bugs sorted, and samples the new bug
+    position among the free ones: a spawn never has to be tried again.
+
+    Bugs move sideways, so sample() reads the k intervals again, and sorts
+    them again. The sort is linear when their order did not change, which
+    is the usual case, so a spawn costs O(k), O(k log k) at worst. k is at
+    most the screen width over the narrowest bug, whatever the number of
+    bugs in play. add() costs O(k) and remove() O(1).
+    """
+
+    def __init__(self, screen_width, strip_bottom):
+        """
+        :Parameters:
+            `screen_width` : float
+                new bugs are placed within [0, screen_width]
+            `strip_bottom` : float
+                bottom of the spawn strip, the top of the screen
+        """
+        self.screen_width = screen_width
+        self.strip_bottom = strip_bottom
+        self._intervals = []    # (left, right, obj) sorted by left
+        self._half_widths = {}  # obj -> half width of its interval, if in the strip
+
+    def add(self, obj, half_width):
+        """
+        records a bug just spawned
+        :Parameters:
+            `obj` : an object with a location and a cshape
+            `half_width` : half width of the space it needs, see sway_half_width
+        """
+        self._half_widths[obj] = half_width
+        x = obj.location[0]
+        bisect.insort(self._intervals, (x - half_width, x + half_width, obj))
+
+    def remove(self, obj):
+        """ forgets a bug, if it is still in the strip. Its interval is
+            dropped by the next update() """
+        self._half_widths.pop(obj, None)
+
+    def clear(self):
+        del self._intervals[:]
+        self._half_widths.clear()
+
+    def update(self):
+        """ follows the bugs of the strip, forgets the ones which left it """
+        half_widths = self._half_widths
+        intervals = []
+        for interval in self._intervals:
+            obj = interval[2]
+            half_width = half_widths.get(obj)
+            if half_width is None:
+                continue    # removed
+            if obj.cshape.minmax()[3] > self.strip_bottom:
+                x = obj.location[0]
+                intervals.append((x - half_width, x + half_width, obj))
+            else:
+                del half_widths[obj]
+        intervals.sort(key=itemgetter(0))
+        self._intervals = intervals
+
+    def free_intervals(self, half_width):
+        """ :rtype: list of the (low, high) intervals of the positions of a
+            new bug, with the given half width, that keep it clear of the
+            others and within the screen """
+        free = []
+        low = half_width
+        for left, right, obj in self._intervals:
+            if obj not in self._half_widths:
+                continue    # removed since the last update()
+            if left - half_width > low:
+                free.append((low, left - half_width))
+            low = max(low, right + half_width)
+        high = self.screen_width - half_width
+        if high > low:
+            free.append((low, high))
+        return free
+
+    def sample(self, generator, half_width):
+        """
+        returns a random free position for a new bug, or None if there is no
+        room left
+        :Parameters:
+            `generator` : random number generator, like the random module
+            `half_width` : half width of the space it needs, see sway_half_width
+        """
+        self.update()
+        free = self.free_intervals(half_width)
+        if not free:
+            return None
+        ends = []       # cumulated lengths of the free intervals
+        total = 0.0
+        for low, high in free:
+            total += high - low
+            ends.append(total)
+        position = generator.uniform(0, total)
+        index = min(bisect.bisect_right(ends, position), len(free) - 1)
+        low, high = free[index]
+        start = ends[index] - (high - low)
+        return min(low + position - start, high)
@@ -0,0 +1,93 @@
+import unittest
+import math
+import random
+from spawn import SpawnAllocator, sway_half_width
+from shapebatch import ShapeBatch
+
+
+class Thing(object):
+    """ a bug on the spawn strip """
+    def __init__(self, batch, x, y, half_width, half_height):
+        self.location = (x, y)
+        self.cshape = batch.add(x, y, half_width, half_height, 0)
+
+    def move_to(self, x, y):
+        self.location = (x, y)
+        self.cshape.move_to(x, y)
+        self.cshape.refresh()
+
+
+class SpawnAllocatorTest (unittest.TestCase):
+
+    def setUp(self):
+        self.batch = ShapeBatch()
+        self.allocator = SpawnAllocator(100, 50)
+
+    def test_free_intervals(self):
+        self.assertEqual(self.allocator.free_intervals(5), [(5, 95)])
+
+        self._add(30, 10)
+        self._add(60, 5)
+        self._add(62, 5)
+        self.assertEqual(self.allocator.free_intervals(5),
+                         [(5, 15), (45, 50), (72, 95)])
+        self.assertEqual(self.allocator.free_intervals(10), [(77, 90)])
+        self.assertEqual(self.allocator.free_intervals(30), [])
+
+    def test_sample_in_free_space(self):
+        generator = random.Random(2)
+        self._add(30, 10)
+        self._add(70, 10)
+        for i in range(200):
+            x = self.allocator.sample(generator, 5)
+            self.assertTrue(5 <= x <= 15 or 45 <= x <= 55 or 85 <= x <= 95, x)
+
+        self._add(10, 10)
+        self._add(50, 10)
+        self._add(90, 10)
+        self.assertEqual(self.allocator.sample(generator, 5), None)
+
+    def test_bugs_leave_the_strip(self):
+        thing = self._add(50, 10)
+        self.assertEqual(len(self.allocator.free_intervals(5)), 2)
+
+        thing.move_to(20, 55)   # still crossing the strip bottom
+        self.allocator.update()
+        self.assertEqual(self.allocator.free_intervals(5), [(35, 95)])
+
+        thing.move_to(20, 30)
+        self.allocator.update()
+        self.assertEqual(self.allocator.free_intervals(5), [(5, 95)])
+        self.allocator.remove(thing)    # already forgotten
+
+    def test_remove(self):
+        self._add(30, 10)
+        thing = self._add(60, 5)
+        self.allocator.remove(thing)
+        self.assertEqual(self.allocator.free_intervals(5), [(5, 15), (45, 95)])
+        self.allocator.update()
+        self.assertEqual(self.allocator.free_intervals(5), [(5, 15), (45, 95)])
+        self.allocator.remove(thing)
+
+    def test_sway_half_width(self):
+        self.assertTrue(are_nearly_equal(sway_half_width(2, 4, 0), 2))
+        self.assertTrue(are_nearly_equal(sway_half_width(2, 4, -90), 4))
+        expected = 2 * math.cos(math.radians(30)) + 4 * math.sin(math.radians(30))
+        self.assertTrue(are_nearly_equal(sway_half_width(2, 4, 30), expected))
+
+    def _add(self, x, half_width):
+        thing = Thing(self.batch, x, 60, half_width, 20)
+        self.allocator.add(thing, half_width)
+        return thing
+
+
+def are_nearly_equal(value1, value2, precision=0.01):
+    """
+        returns true when the first value is nearly equals to the second
+    """
+    delta = math.fabs(value1 - value2)
+    return delta <= precision
+
+
+if __name__ == '__main__':
+    unittest.main()